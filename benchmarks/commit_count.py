@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Counts the commits (and with that the fsyncs) of the ingest and of a
+subscription, once with one commit per statement as the old execute_query
+did and once with utils.transaction. The commits are counted with a trace
+callback on the connection
+
+    python benchmarks/commit_count.py [--regions 2100] [--snapshots 5]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "telegram_bot"))
+
+from constants import Database as db_const  # noqa: E402
+import data_builder  # noqa: E402
+import utils  # noqa: E402
+
+
+class CommitCounter():
+    '''Counts the statements of a connection that end a transaction'''
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.commits = 0
+        connection.set_trace_callback(self.trace)
+
+    def trace(self, statement):
+        # in autocommit-mode every write outside of a transaction is a
+        # commit of its own
+        statement = statement.lstrip().upper()
+        if statement.startswith("COMMIT") or (
+                statement.startswith(("INSERT", "UPDATE", "DELETE")) and
+                not self.connection.in_transaction):
+            self.commits += 1
+
+    def reset(self):
+        self.commits = 0
+
+
+def generate_snapshots(snapshots, regions):
+    '''Returns snapshots in which a tenth of the regions change their level'''
+    start = datetime.datetime(2020, 9, 4)
+
+    return [{"Stand": (start + datetime.timedelta(days=7 * number)).strftime(
+                 "%Y-%m-%dT%H:%M:%S+02:00"),
+             "Warnstufen": [{"GKZ": str(10000 + region),
+                             "Warnstufe": str((number + region // 10) % 4
+                                              + 1)}
+                            for region in range(regions)]}
+            for number in range(snapshots)]
+
+
+def ingest_per_statement(connection, snapshots):
+    '''The old ingest, every statement commits on its own'''
+    for number, snapshot in enumerate(snapshots):
+        connection.execute(db_const.BULK_INSERT_UPDATE_TIME,
+                           (snapshot["Stand"],))
+
+        for region in snapshot["Warnstufen"]:
+            connection.execute(db_const.BULK_INSERT_WARNING,
+                               (number + 1, 1, int(region["GKZ"]),
+                                int(region["Warnstufe"]), "Null"))
+
+
+def subscribe(connection, user_id, region_id):
+    '''The statements of a subscription via the inline-keyboard'''
+    if utils.fetch_one(connection, db_const.LOOKUP_USER,
+                       {"user_id": user_id}) is None:
+        utils.execute(connection, db_const.INSERT_USER,
+                      {"id": user_id, "name": "user"})
+
+    if utils.fetch_one(connection, db_const.SUB_USER_REGION_LOOKUP,
+                       {"user_id": user_id, "region_id": region_id}) is None:
+        utils.execute(connection, db_const.SUB_USER_REGION_INSERT,
+                      {"user_id": user_id, "region_id": region_id})
+
+
+def run(name, connection, counter, work):
+    '''Runs the work and prints its commits and its duration'''
+    counter.reset()
+    started = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - started
+
+    print("{name:>34}: {commits:6d} commits, {elapsed:7.3f}s".format(
+        name=name, commits=counter.commits, elapsed=elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--regions", type=int, default=2100)
+    parser.add_argument("--snapshots", type=int, default=5)
+    parser.add_argument("--users", type=int, default=200)
+    arguments = parser.parse_args()
+
+    snapshots = generate_snapshots(arguments.snapshots, arguments.regions)
+
+    with tempfile.TemporaryDirectory() as directory:
+        databases = []
+
+        # one database per variant, so both write the same rows
+        for name in ("per-statement", "transaction"):
+            connection = data_builder.create_database(
+                os.path.join(directory, name + ".db"))
+            connection.executemany(
+                "INSERT INTO regions (id, type, name) VALUES (?, ?, ?);",
+                [(10000 + region, "Gemeinde", str(region))
+                 for region in range(arguments.regions)])
+            databases.append((connection, CommitCounter(connection)))
+
+        (old, old_counter), (new, new_counter) = databases
+
+        run("ingest, commit per statement", old, old_counter,
+            lambda: ingest_per_statement(old, snapshots))
+        run("ingest, transaction per snapshot", new, new_counter,
+            lambda: data_builder.insert_warnings(new, snapshots))
+
+        def subscribe_per_statement():
+            for user_id in range(arguments.users):
+                subscribe(old, user_id, 10000 + user_id)
+
+        def subscribe_in_transaction():
+            for user_id in range(arguments.users):
+                with utils.transaction(new):
+                    subscribe(new, user_id, 10000 + user_id)
+
+        run("{users} subscriptions, per statement".format(
+            users=arguments.users), old, old_counter,
+            subscribe_per_statement)
+        run("{users} subscriptions, transaction".format(
+            users=arguments.users), new, new_counter,
+            subscribe_in_transaction)
+
+        for connection, _ in databases:
+            connection.close()
+
+
+if __name__ == "__main__":
+    main()
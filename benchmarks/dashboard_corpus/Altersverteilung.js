@@ -0,0 +1,2 @@
+var dpAltersverteilung = [{"label": "<5", "y": 17611}, {"label": "5-14", "y": 74606}, {"label": "15-24", "y": 8271}, {"label": "25-34", "y": 33432}, {"label": "35-44", "y": 15455}, {"label": "45-54", "y": 64937}, {"label": "55-64", "y": 99740}, {"label": "65-74", "y": 58915}, {"label": "75-84", "y": 61898}, {"label": ">84", "y": 85405}];
+var AltersverteilungVersion = "18.10.2020 09:30.00V";
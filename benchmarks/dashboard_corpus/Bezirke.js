@@ -0,0 +1,2 @@
+var dpBezirke = [{"label": "Bezirk 0", "y": 276}, {"label": "Bezirk 1", "y": 91204}, {"label": "Bezirk 2", "y": 58377}, {"label": "Bezirk 3", "y": 34908}, {"label": "Bezirk 4", "y": 94573}, {"label": "Bezirk 5", "y": 29984}, {"label": "Bezirk 6", "y": 77483}, {"label": "Bezirk 7", "y": 13399}, {"label": "Bezirk 8", "y": 41606}, {"label": "Bezirk 9", "y": 4009}, {"label": "Bezirk 10", "y": 2925}, {"label": "Bezirk 11", "y": 3335}, {"label": "Bezirk 12", "y": 85137}, {"label": "Bezirk 13", "y": 70964}, {"label": "Bezirk 14", "y": 1206}, {"label": "Bezirk 15", "y": 49965}, {"label": "Bezirk 16", "y": 89978}, {"label": "Bezirk 17", "y": 28390}, {"label": "Bezirk 18", "y": 55327}, {"label": "Bezirk 19", "y": 95138}, {"label": "Bezirk 20", "y": 3806}, {"label": "Bezirk 21", "y": 69157}, {"label": "Bezirk 22", "y": 29057}, {"label": "Bezirk 23", "y": 57394}, {"label": "Bezirk 24", "y": 64987}, {"label": "Bezirk 25", "y": 72464}, {"label": "Bezirk 26", "y": 30550}, {"label": "Bezirk 27", "y": 45311}, {"label": "Bezirk 28", "y": 30260}, {"label": "Bezirk 29", "y": 88715}, {"label": "Bezirk 30", "y": 28676}, {"label": "Bezirk 31", "y": 99738}, {"label": "Bezirk 32", "y": 60241}, {"label": "Bezirk 33", "y": 37982}, {"label": "Bezirk 34", "y": 2816}, {"label": "Bezirk 35", "y": 54549}, {"label": "Bezirk 36", "y": 72935}, {"label": "Bezirk 37", "y": 84186}, {"label": "Bezirk 38", "y": 13107}, {"label": "Bezirk 39", "y": 24367}, {"label": "Bezirk 40", "y": 82490}, {"label": "Bezirk 41", "y": 94848}, {"label": "Bezirk 42", "y": 38848}, {"label": "Bezirk 43", "y": 15845}, {"label": "Bezirk 44", "y": 97405}, {"label": "Bezirk 45", "y": 43607}, {"label": "Bezirk 46", "y": 94566}, {"label": "Bezirk 47", "y": 93217}, {"label": "Bezirk 48", "y": 65640}, {"label": "Bezirk 49", "y": 55326}, {"label": "Bezirk 50", "y": 66547}, {"label": "Bezirk 51", "y": 87858}, {"label": "Bezirk 52", "y": 24883}, {"label": "Bezirk 53", "y": 39763}, {"label": "Bezirk 54", "y": 37245}, {"label": "Bezirk 55", "y": 77015}, {"label": "Bezirk 56", "y": 65452}, {"label": "Bezirk 57", "y": 66228}, {"label": "Bezirk 58", "y": 51557}, {"label": "Bezirk 59", "y": 77201}, {"label": "Bezirk 60", "y": 4525}, {"label": "Bezirk 61", "y": 62944}, {"label": "Bezirk 62", "y": 31816}, {"label": "Bezirk 63", "y": 97482}, {"label": "Bezirk 64", "y": 52990}, {"label": "Bezirk 65", "y": 54304}, {"label": "Bezirk 66", "y": 87129}, {"label": "Bezirk 67", "y": 22676}, {"label": "Bezirk 68", "y": 48119}, {"label": "Bezirk 69", "y": 71932}, {"label": "Bezirk 70", "y": 92148}, {"label": "Bezirk 71", "y": 88406}, {"label": "Bezirk 72", "y": 96759}, {"label": "Bezirk 73", "y": 49113}, {"label": "Bezirk 74", "y": 11333}, {"label": "Bezirk 75", "y": 57535}, {"label": "Bezirk 76", "y": 87000}, {"label": "Bezirk 77", "y": 66640}, {"label": "Bezirk 78", "y": 14146}, {"label": "Bezirk 79", "y": 21456}, {"label": "Bezirk 80", "y": 68280}, {"label": "Bezirk 81", "y": 51544}, {"label": "Bezirk 82", "y": 48565}, {"label": "Bezirk 83", "y": 64185}, {"label": "Bezirk 84", "y": 96045}, {"label": "Bezirk 85", "y": 3876}, {"label": "Bezirk 86", "y": 61514}, {"label": "Bezirk 87", "y": 5699}, {"label": "Bezirk 88", "y": 40439}, {"label": "Bezirk 89", "y": 92193}, {"label": "Bezirk 90", "y": 80584}, {"label": "Bezirk 91", "y": 77749}, {"label": "Bezirk 92", "y": 75782}, {"label": "Bezirk 93", "y": 51589}];
+var BezirkeVersion = "18.10.2020 09:30.00V";
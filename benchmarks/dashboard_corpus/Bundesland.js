@@ -0,0 +1,2 @@
+var dpBundesland = [{"label": "Burgenland", "y": 49756}, {"label": "Kärnten", "y": 27519}, {"label": "Niederösterreich", "y": 12302}, {"label": "Oberösterreich", "y": 63944}, {"label": "Salzburg", "y": 3715}, {"label": "Steiermark", "y": 51093}, {"label": "Tirol", "y": 56723}, {"label": "Vorarlberg", "y": 79618}, {"label": "Wien", "y": 99913}];
+var BundeslandVersion = "18.10.2020 09:30.00V";
@@ -0,0 +1,2 @@
+var dpEpikurve = [{"label": "01.02.2020", "y": 84824}, {"label": "02.02.2020", "y": 22328}, {"label": "03.02.2020", "y": 22097}, {"label": "04.02.2020", "y": 65829}, {"label": "05.02.2020", "y": 29745}, {"label": "06.02.2020", "y": 1612}, {"label": "07.02.2020", "y": 26151}, {"label": "08.02.2020", "y": 70728}, {"label": "09.02.2020", "y": 71871}, {"label": "10.02.2020", "y": 30431}, {"label": "11.02.2020", "y": 53012}, {"label": "12.02.2020", "y": 67341}, {"label": "13.02.2020", "y": 45065}, {"label": "14.02.2020", "y": 75732}, {"label": "15.02.2020", "y": 46304}, {"label": "16.02.2020", "y": 60179}, {"label": "17.02.2020", "y": 35294}, {"label": "18.02.2020", "y": 86404}, {"label": "19.02.2020", "y": 71826}, {"label": "20.02.2020", "y": 79815}, {"label": "21.02.2020", "y": 95603}, {"label": "22.02.2020", "y": 748}, {"label": "23.02.2020", "y": 50290}, {"label": "24.02.2020", "y": 97059}, {"label": "25.02.2020", "y": 67174}, {"label": "26.02.2020", "y": 16940}, {"label": "27.02.2020", "y": 67984}, {"label": "28.02.2020", "y": 73578}, {"label": "01.03.2020", "y": 26933}, {"label": "02.03.2020", "y": 55848}, {"label": "03.03.2020", "y": 7356}, {"label": "04.03.2020", "y": 63058}, {"label": "05.03.2020", "y": 47806}, {"label": "06.03.2020", "y": 74710}, {"label": "07.03.2020", "y": 72666}, {"label": "08.03.2020", "y": 26193}, {"label": "09.03.2020", "y": 66154}, {"label": "10.03.2020", "y": 54185}, {"label": "11.03.2020", "y": 63560}, {"label": "12.03.2020", "y": 46765}, {"label": "13.03.2020", "y": 54319}, {"label": "14.03.2020", "y": 45361}, {"label": "15.03.2020", "y": 207}, {"label": "16.03.2020", "y": 70579}, {"label": "17.03.2020", "y": 70793}, {"label": "18.03.2020", "y": 81722}, {"label": "19.03.2020", "y": 80275}, {"label": "20.03.2020", "y": 43402}, {"label": "21.03.2020", "y": 60050}, {"label": "22.03.2020", "y": 78624}, {"label": "23.03.2020", "y": 3666}, {"label": "24.03.2020", "y": 30094}, {"label": "25.03.2020", "y": 83279}, {"label": "26.03.2020", "y": 23227}, {"label": "27.03.2020", "y": 72188}, {"label": "28.03.2020", "y": 76606}, {"label": "01.04.2020", "y": 23695}, {"label": "02.04.2020", "y": 12006}, {"label": "03.04.2020", "y": 72224}, {"label": "04.04.2020", "y": 33461}, {"label": "05.04.2020", "y": 4254}, {"label": "06.04.2020", "y": 88226}, {"label": "07.04.2020", "y": 9234}, {"label": "08.04.2020", "y": 10909}, {"label": "09.04.2020", "y": 2187}, {"label": "10.04.2020", "y": 59375}, {"label": "11.04.2020", "y": 1908}, {"label": "12.04.2020", "y": 98847}, {"label": "13.04.2020", "y": 99036}, {"label": "14.04.2020", "y": 36857}, {"label": "15.04.2020", "y": 32710}, {"label": "16.04.2020", "y": 35211}, {"label": "17.04.2020", "y": 14350}, {"label": "18.04.2020", "y": 81894}, {"label": "19.04.2020", "y": 24197}, {"label": "20.04.2020", "y": 45144}, {"label": "21.04.2020", "y": 38048}, {"label": "22.04.2020", "y": 9111}, {"label": "23.04.2020", "y": 21950}, {"label": "24.04.2020", "y": 20922}, {"label": "25.04.2020", "y": 33451}, {"label": "26.04.2020", "y": 69124}, {"label": "27.04.2020", "y": 22039}, {"label": "28.04.2020", "y": 86069}, {"label": "01.05.2020", "y": 35771}, {"label": "02.05.2020", "y": 84961}, {"label": "03.05.2020", "y": 93269}, {"label": "04.05.2020", "y": 38599}, {"label": "05.05.2020", "y": 59598}, {"label": "06.05.2020", "y": 92094}, {"label": "07.05.2020", "y": 42205}, {"label": "08.05.2020", "y": 65076}, {"label": "09.05.2020", "y": 62098}, {"label": "10.05.2020", "y": 14967}, {"label": "11.05.2020", "y": 3097}, {"label": "12.05.2020", "y": 40895}, {"label": "13.05.2020", "y": 50666}, {"label": "14.05.2020", "y": 45002}, {"label": "15.05.2020", "y": 55170}, {"label": "16.05.2020", "y": 24646}, {"label": "17.05.2020", "y": 33871}, {"label": "18.05.2020", "y": 14255}, {"label": "19.05.2020", "y": 33221}, {"label": "20.05.2020", "y": 95702}, {"label": "21.05.2020", "y": 66861}, {"label": "22.05.2020", "y": 27405}, {"label": "23.05.2020", "y": 79383}, {"label": "24.05.2020", "y": 56577}, {"label": "25.05.2020", "y": 2728}, {"label": "26.05.2020", "y": 29540}, {"label": "27.05.2020", "y": 2341}, {"label": "28.05.2020", "y": 52076}, {"label": "01.06.2020", "y": 19197}, {"label": "02.06.2020", "y": 4630}, {"label": "03.06.2020", "y": 94219}, {"label": "04.06.2020", "y": 21001}, {"label": "05.06.2020", "y": 58414}, {"label": "06.06.2020", "y": 92354}, {"label": "07.06.2020", "y": 66362}, {"label": "08.06.2020", "y": 88889}, {"label": "09.06.2020", "y": 55923}, {"label": "10.06.2020", "y": 71395}, {"label": "11.06.2020", "y": 28914}, {"label": "12.06.2020", "y": 82676}, {"label": "13.06.2020", "y": 91101}, {"label": "14.06.2020", "y": 67711}, {"label": "15.06.2020", "y": 59093}, {"label": "16.06.2020", "y": 29254}, {"label": "17.06.2020", "y": 68668}, {"label": "18.06.2020", "y": 85001}, {"label": "19.06.2020", "y": 4023}, {"label": "20.06.2020", "y": 51760}, {"label": "21.06.2020", "y": 88460}, {"label": "22.06.2020", "y": 75477}, {"label": "23.06.2020", "y": 42106}, {"label": "24.06.2020", "y": 86484}, {"label": "25.06.2020", "y": 82699}, {"label": "26.06.2020", "y": 55875}, {"label": "27.06.2020", "y": 7705}, {"label": "28.06.2020", "y": 96659}, {"label": "01.07.2020", "y": 39138}, {"label": "02.07.2020", "y": 16473}, {"label": "03.07.2020", "y": 27804}, {"label": "04.07.2020", "y": 6218}, {"label": "05.07.2020", "y": 40158}, {"label": "06.07.2020", "y": 9270}, {"label": "07.07.2020", "y": 10019}, {"label": "08.07.2020", "y": 40679}, {"label": "09.07.2020", "y": 39043}, {"label": "10.07.2020", "y": 97496}, {"label": "11.07.2020", "y": 20736}, {"label": "12.07.2020", "y": 54548}, {"label": "13.07.2020", "y": 74047}, {"label": "14.07.2020", "y": 33077}, {"label": "15.07.2020", "y": 17090}, {"label": "16.07.2020", "y": 1111}, {"label": "17.07.2020", "y": 73494}, {"label": "18.07.2020", "y": 4969}, {"label": "19.07.2020", "y": 77409}, {"label": "20.07.2020", "y": 28520}, {"label": "21.07.2020", "y": 74747}, {"label": "22.07.2020", "y": 60404}, {"label": "23.07.2020", "y": 22481}, {"label": "24.07.2020", "y": 92277}, {"label": "25.07.2020", "y": 81652}, {"label": "26.07.2020", "y": 66699}, {"label": "27.07.2020", "y": 4905}, {"label": "28.07.2020", "y": 49541}, {"label": "01.08.2020", "y": 26267}, {"label": "02.08.2020", "y": 45472}, {"label": "03.08.2020", "y": 12979}, {"label": "04.08.2020", "y": 26969}, {"label": "05.08.2020", "y": 75154}, {"label": "06.08.2020", "y": 88362}, {"label": "07.08.2020", "y": 56747}, {"label": "08.08.2020", "y": 77517}, {"label": "09.08.2020", "y": 25443}, {"label": "10.08.2020", "y": 64533}, {"label": "11.08.2020", "y": 13687}, {"label": "12.08.2020", "y": 87288}, {"label": "13.08.2020", "y": 51126}, {"label": "14.08.2020", "y": 38806}, {"label": "15.08.2020", "y": 66074}, {"label": "16.08.2020", "y": 65509}, {"label": "17.08.2020", "y": 2254}, {"label": "18.08.2020", "y": 42643}, {"label": "19.08.2020", "y": 80232}, {"label": "20.08.2020", "y": 52733}, {"label": "21.08.2020", "y": 36877}, {"label": "22.08.2020", "y": 2371}, {"label": "23.08.2020", "y": 20573}, {"label": "24.08.2020", "y": 26326}, {"label": "25.08.2020", "y": 42957}, {"label": "26.08.2020", "y": 73838}, {"label": "27.08.2020", "y": 17713}, {"label": "28.08.2020", "y": 44445}, {"label": "01.09.2020", "y": 56261}, {"label": "02.09.2020", "y": 27922}, {"label": "03.09.2020", "y": 34935}, {"label": "04.09.2020", "y": 88402}, {"label": "05.09.2020", "y": 12636}, {"label": "06.09.2020", "y": 49706}, {"label": "07.09.2020", "y": 71778}, {"label": "08.09.2020", "y": 45069}, {"label": "09.09.2020", "y": 90060}, {"label": "10.09.2020", "y": 70035}, {"label": "11.09.2020", "y": 63504}, {"label": "12.09.2020", "y": 69798}, {"label": "13.09.2020", "y": 30754}, {"label": "14.09.2020", "y": 8561}, {"label": "15.09.2020", "y": 95088}, {"label": "16.09.2020", "y": 5295}, {"label": "17.09.2020", "y": 11099}, {"label": "18.09.2020", "y": 17434}, {"label": "19.09.2020", "y": 22242}, {"label": "20.09.2020", "y": 21830}, {"label": "21.09.2020", "y": 70544}, {"label": "22.09.2020", "y": 27914}, {"label": "23.09.2020", "y": 35128}, {"label": "24.09.2020", "y": 99498}, {"label": "25.09.2020", "y": 43546}, {"label": "26.09.2020", "y": 78670}, {"label": "27.09.2020", "y": 66307}, {"label": "28.09.2020", "y": 33461}, {"label": "01.10.2020", "y": 48248}, {"label": "02.10.2020", "y": 44413}, {"label": "03.10.2020", "y": 44601}, {"label": "04.10.2020", "y": 14930}, {"label": "05.10.2020", "y": 38170}, {"label": "06.10.2020", "y": 30826}, {"label": "07.10.2020", "y": 79165}, {"label": "08.10.2020", "y": 93730}, {"label": "09.10.2020", "y": 64067}, {"label": "10.10.2020", "y": 17740}, {"label": "11.10.2020", "y": 76016}, {"label": "12.10.2020", "y": 72243}, {"label": "13.10.2020", "y": 13667}, {"label": "14.10.2020", "y": 42038}, {"label": "15.10.2020", "y": 5129}, {"label": "16.10.2020", "y": 53293}];
+var EpikurveVersion = "18.10.2020 09:30.00V";
@@ -0,0 +1,2 @@
+var dpGesTestungen = "2.345.678";
+var GesamtzahlTestungenVersion = "18.10.2020 09:30.00V";
@@ -0,0 +1,2 @@
+var dpGeschlechtsverteilung = [{"label":"weiblich","y":51},{"label":"männlich","y":49}];
+var GeschlechtsverteilungVersion = "18.10.2020 09:30.00V";
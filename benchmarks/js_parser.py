@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Compares utils.simple_js_parser with the line-based parser it replaced on a
+synthetic corpus shaped like the files of the corona-dashboard (age, state,
+district and epicurve arrays plus scalar and version variables). Checks that
+both return the same data and prints their throughput
+
+    python benchmarks/js_parser.py [--rounds 300]
+"""
+
+import argparse
+import ast
+import os
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARK_DIR, "dashboard_corpus")
+
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "telegram_bot"))
+
+import utils  # noqa: E402
+
+
+def line_parser(pagecontent):
+    '''The previous parser: one "var name = literal;" per line'''
+    variables = {}
+
+    for line in pagecontent.strip("\n").split("\n"):
+        line_data = line.replace("var", "").split(" = ")
+        variables[line_data[0].strip()] = ast.literal_eval(
+            line_data[1].strip(";"))
+
+    return variables
+
+
+def load_corpus():
+    '''Returns the files of the corpus as a name -> content dict'''
+    corpus = {}
+
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        with open(os.path.join(CORPUS_DIR, name), "r",
+                  encoding="utf-8") as file:
+            corpus[name] = file.read()
+
+    return corpus
+
+
+def throughput(parser, corpus, rounds):
+    '''Returns the MB/s and the milliseconds per corpus of the parser'''
+    size = sum(len(content.encode("utf-8")) for content in corpus.values())
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for content in corpus.values():
+            parser(content)
+    elapsed = time.perf_counter() - started
+
+    return size * rounds / elapsed / 1e6, elapsed / rounds * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=300)
+    arguments = parser.parse_args()
+
+    corpus = load_corpus()
+
+    for name, content in corpus.items():
+        if line_parser(content) != utils.simple_js_parser(content):
+            sys.exit("{name}: the parsers disagree".format(name=name))
+
+    print("corpus: {files} files, {size:.1f} KB, both parsers agree".format(
+        files=len(corpus),
+        size=sum(len(content.encode("utf-8"))
+                 for content in corpus.values()) / 1e3))
+
+    for name, function in (("line parser", line_parser),
+                           ("simple_js_parser", utils.simple_js_parser)):
+        rate, milliseconds = throughput(function, corpus, arguments.rounds)
+        print("{name:>16}: {rate:6.1f} MB/s ({milliseconds:.2f} ms per "
+              "corpus)".format(name=name, rate=rate,
+                               milliseconds=milliseconds))
+
+
+if __name__ == "__main__":
+    main()
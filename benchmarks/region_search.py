@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Compares the region-search of /subscribe: the LIKE-query it replaced, the
+in-memory trigram-index and the full-text index of the database. The
+municipality names are synthetic, with many shared stems as the worst case
+for the index. Checks that the index finds everything the LIKE-query finds
+
+    python benchmarks/region_search.py [--rounds 500]
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "telegram_bot"))
+
+import migrations  # noqa: E402
+import region_index  # noqa: E402
+import utils  # noqa: E402
+
+# the search before the index, it scans the whole regions-table
+LIKE_QUERY = ("select name, id from regions where name like "
+              "'%' || :region_name || '%' "
+              "and type = 'Gemeinde';")
+
+PREFIXES = ["Sankt ", "St. ", "Bad ", "Maria ", "Groß", "Klein", "Ober",
+            "Unter", "Neu", "Alt", ""]
+STEMS = ["pölten", "wörth", "kirchen", "dorf", "brunn", "feld", "au",
+         "hausen", "stein", "berg", "bach", "thal", "münster", "eck",
+         "grünbach", "hof", "reith", "schwarzach", "lambrecht", "ach"]
+SUFFIXES = ["", "dorf", "au", "berg", " am Inn", " an der Donau",
+            " bei Graz"]
+
+QUERIES = ["Poelten", "wien", "kirch", "Grünbach", "bad au", "eisen", "xyz",
+           "schwarzach", "St. Pölten"]
+
+
+def generate_names():
+    '''Returns the synthetic names of the municipalities'''
+    names = {(prefix + stem.capitalize() + suffix).strip()
+             for prefix, stem, suffix
+             in itertools.product(PREFIXES, STEMS, SUFFIXES)}
+
+    return sorted(names) + ["Eisenstadt", "Wien"]
+
+
+def measure(function, query, rounds):
+    '''Returns the microseconds per call of function(query)'''
+    started = time.perf_counter()
+    for _ in range(rounds):
+        function(query)
+
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=500)
+    arguments = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    names = generate_names()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = utils.ConnectionManager(os.path.join(directory,
+                                                        "regions.db"))
+
+        with database.writer() as connection:
+            migrations.migrate(connection)
+            connection.executemany(
+                "INSERT INTO regions (id, type, name) VALUES (?, ?, ?);",
+                [(10000 + number, "Gemeinde", name)
+                 for number, name in enumerate(names)] +
+                [(number, "Bezirk", "Bezirk %d" % number)
+                 for number in range(100)])
+            region_index.fill_region_search(connection)
+
+        connection = database.reader()
+        index = region_index.RegionIndex()
+        index.refresh(connection)
+        fts = region_index.FtsRegionSearch(database)
+
+        def like(query):
+            return utils.fetch_all(connection, LIKE_QUERY,
+                                   {"region_name": query})
+
+        def uncached(query):
+            index.results = {}
+            return index.search(query)
+
+        print("{count} municipalities, microseconds per search".format(
+            count=len(names)))
+        print("{:<12} {:>8} {:>8} {:>9} {:>8} {:>5}".format(
+            "query", "LIKE", "index", "uncached", "fts", "hits"))
+
+        for query in QUERIES:
+            found = {result[:2] for result in index.search(query)}
+            missing = set(like(query)) - found
+            if missing:
+                sys.exit("{query}: the index misses {missing}".format(
+                    query=query, missing=sorted(missing)))
+
+            print("{:<12} {:8.1f} {:8.1f} {:9.1f} {:8.1f} {:5d}".format(
+                query,
+                measure(like, query, max(1, arguments.rounds // 10)),
+                measure(index.search, query, arguments.rounds),
+                measure(uncached, query, arguments.rounds),
+                measure(fts.search, query, arguments.rounds),
+                len(found)))
+
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
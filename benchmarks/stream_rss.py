@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Compares the peak memory of reading the Warnstufen-history with json.loads
+and with data_builder.stream_snapshots. Every mode runs in its own process,
+so the peak RSS of one does not hide the other
+
+    python benchmarks/stream_rss.py [--snapshots 150] [--regions 2100]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "telegram_bot"))
+
+
+def generate_history(path, snapshots, regions):
+    '''Writes a synthetic history with the layout of the corona-ampel file'''
+    start = datetime.datetime(2020, 9, 4)
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("[")
+
+        for number in range(snapshots):
+            stand = (start + datetime.timedelta(days=7 * number)).strftime(
+                "%Y-%m-%dT%H:%M:%S+02:00")
+            snapshot = {"Stand": stand,
+                        "Warnstufen": [{"Region": "Gemeinde",
+                                        "GKZ": str(10000 + region),
+                                        "Name": "Gemeinde %d" % region,
+                                        "Warnstufe": str((number + region)
+                                                         % 4 + 1)}
+                                       for region in range(regions)]}
+
+            if number > 0:
+                file.write(",")
+            json.dump(snapshot, file)
+
+        file.write("]")
+
+
+def measure(mode, path):
+    '''Reads the history in one mode, prints the warnings and the peak RSS'''
+    warnings = 0
+
+    if mode == "json.loads":
+        with open(path, "r", encoding="utf-8") as file:
+            for snapshot in json.loads(file.read()):
+                warnings += len(snapshot["Warnstufen"])
+    else:
+        import data_builder
+
+        for snapshot in data_builder.stream_snapshots(path):
+            warnings += len(snapshot["Warnstufen"])
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print("{mode:>18}: {warnings} warnings, peak RSS {peak} MB".format(
+        mode=mode, warnings=warnings, peak=peak))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snapshots", type=int, default=150)
+    parser.add_argument("--regions", type=int, default=2100)
+    parser.add_argument("--measure", choices=["json.loads", "stream"],
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    # the child-processes only measure
+    if arguments.measure:
+        measure(arguments.measure, arguments.path)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.json")
+        generate_history(path, arguments.snapshots, arguments.regions)
+
+        print("history: {size:.1f} MB".format(
+            size=os.path.getsize(path) / 1e6))
+
+        for mode in ("json.loads", "stream"):
+            subprocess.run([sys.executable, __file__, "--measure", mode,
+                            "--path", path], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures the memory and the lookups of subscriptions.SubscriptionIndex for
+synthetic users with one to six subscriptions each. The memory is taken
+with tracemalloc, once for the index and once with sets instead of sorted
+tuples on the user -> regions side. The lookups are compared with the
+queries the bot used before the index
+
+    python benchmarks/subscription_index.py [--users 100000]
+"""
+
+import argparse
+import gc
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "telegram_bot"))
+
+import migrations  # noqa: E402
+import subscriptions  # noqa: E402
+import utils  # noqa: E402
+
+# the listing of /showsubscriptions before the index
+REGIONS_QUERY = ("select regions.name, regions.id "
+                 "from users, regions, subscriptions "
+                 "where (subscriptions.regions_id = regions.id "
+                 "and subscriptions.users_id = :user_id "
+                 "and subscriptions.users_id = users.id);")
+
+# the subscribers of a region for the fan-out before the index
+SUBSCRIBERS_QUERY = ("SELECT subscriptions.users_id "
+                     "FROM subscriptions, users "
+                     "WHERE subscriptions.regions_id = :region_id "
+                     "AND users.id = subscriptions.users_id "
+                     "AND users.active = 1;")
+
+
+def fill_database(connection, users, regions, seed):
+    '''Writes the users, the regions and their subscriptions'''
+    generator = random.Random(seed)
+    region_ids = [10000 + region for region in range(regions)]
+
+    connection.executemany(
+        "INSERT INTO regions (id, type, name) VALUES (?, 'Gemeinde', ?);",
+        [(region_id, str(region_id)) for region_id in region_ids])
+    connection.executemany(
+        "INSERT INTO users (id, name, active) VALUES (?, ?, ?);",
+        [(user_id, "user", int(user_id % 50 != 0))
+         for user_id in range(users)])
+    connection.executemany(
+        "INSERT INTO subscriptions (users_id, regions_id) VALUES (?, ?);",
+        [(user_id, region_id) for user_id in range(users)
+         for region_id in generator.sample(region_ids,
+                                           generator.randint(1, 6))])
+
+
+def measure_memory(build):
+    '''Returns the megabytes allocated by build() that are still in use'''
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # only dropped once the memory got taken
+    del result
+
+    return size / 1e6
+
+
+def with_user_sets(connection):
+    '''The index with sets on the user -> regions side'''
+    by_region, by_user, inactive = subscriptions.load(connection)
+
+    return by_region, {user_id: set(regions)
+                       for user_id, regions in by_user.items()}, inactive
+
+
+def per_call(function, arguments):
+    '''Returns the microseconds per call of function over the arguments'''
+    started = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+
+    return (time.perf_counter() - started) / len(arguments) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--regions", type=int, default=2100)
+    parser.add_argument("--seed", type=int, default=1)
+    arguments = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = utils.ConnectionManager(os.path.join(directory,
+                                                        "bot.db"))
+
+        with database.writer() as connection:
+            migrations.migrate(connection)
+            fill_database(connection, arguments.users, arguments.regions,
+                          arguments.seed)
+
+        connection = database.reader()
+        count = utils.fetch_one(connection,
+                                "SELECT count(*) FROM subscriptions;")[0]
+        print("{users} users, {count} subscriptions to {regions} "
+              "regions".format(users=arguments.users, count=count,
+                               regions=arguments.regions))
+
+        index = subscriptions.SubscriptionIndex()
+
+        print("{:>34}: {:7.1f} MB".format(
+            "index", measure_memory(lambda: subscriptions.load(connection))))
+        print("{:>34}: {:7.1f} MB".format(
+            "index with user -> region sets",
+            measure_memory(lambda: with_user_sets(connection))))
+
+        started = time.perf_counter()
+        index.load(connection)
+        print("{:>34}: {:7.2f} s".format("load",
+                                         time.perf_counter() - started))
+
+        with database.writer() as writer:
+            started = time.perf_counter()
+            index.reconcile(writer)
+            print("{:>34}: {:7.2f} s".format("reconcile",
+                                             time.perf_counter() - started))
+
+        users = random.Random(arguments.seed).sample(
+            range(arguments.users), min(1000, arguments.users))
+        print("{:>34}: {:7.1f} us index, {:.1f} us query".format(
+            "regions of one user",
+            per_call(index.regions, users),
+            per_call(lambda user_id: utils.fetch_all(
+                connection, REGIONS_QUERY, {"user_id": user_id}), users)))
+
+        regions = [10000 + region for region in range(arguments.regions)]
+        print("{:>34}: {:7.1f} ms index, {:.1f} ms query".format(
+            "subscribers of every region",
+            per_call(index.subscribers, regions) * len(regions) / 1e3,
+            per_call(lambda region_id: utils.fetch_all(
+                connection, SUBSCRIBERS_QUERY, {"region_id": region_id}),
+                regions) * len(regions) / 1e3))
+
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
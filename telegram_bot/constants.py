@@ -13,6 +13,70 @@ CORONAKOMMISSIONV2 = ("https://corona-ampel.gv.at"
 WARNSTUFEN_AKTUELL = ("https://corona-ampel.gv.at/sites/corona-ampel.gv.at/"
                       "files/assets/Warnstufen_Corona_Ampel_aktuell.json")
 
+# name under which the hash of the last region-sync is stored
+REGIONS_SYNC_NAME = "regions"
+
+# directory in which the last response of every corona-ampel file is kept,
+# together with its etag/last-modified header until it got ingested. The
+# headers of the ingested responses are kept in the database
+RESPONSE_CACHE_DIR = "static/response_cache"
+HTTP_TIMEOUT = 30
+HTTP_CHUNK_SIZE = 64 * 1024
+
+# number of compiled statements every database connection keeps, this has to
+# be larger than the number of queries in the Database-class
+STATEMENT_CACHE_SIZE = 128
+
+# how long a connection waits for a lock before failing, in seconds
+DATABASE_TIMEOUT = 30
+
+# Cache of the dashboard-data in seconds. Entries older than the refresh-time
+# get reloaded in the background, entries older than the ttl are stale but
+# still served until a reload succeeds. The scheduler looks for entries to
+# refresh every check-interval, so the cache stays warm without any requests
+DASHBOARD_CACHE_TTL = 60 * 60
+DASHBOARD_CACHE_REFRESH = 45 * 60
+DASHBOARD_CACHE_CHECK = 5 * 60
+DASHBOARD_CACHE_SIZE = 32
+
+# number of dashboard-files that are downloaded at the same time, this is
+# also the number of kept-alive connections to the dashboard
+DASHBOARD_FETCH_WORKERS = 10
+
+# Delivery of the alert-messages. Telegram allows about 30 messages per
+# second over all chats and one message per second to the same chat. The
+# rate is the budget of the whole bot, standalone delivery-workers split it
+# between their shards
+DELIVERY_WORKERS = 8
+DELIVERY_RATE = 25
+DELIVERY_BURST = 25
+DELIVERY_CHAT_INTERVAL = 1.0
+DELIVERY_MAX_RETRIES = 5
+DELIVERY_BACKOFF = 1.0
+
+# connections the bot keeps open to telegram, one per sending thread and a
+# few more for the other calls. With fewer, every concurrent send opens and
+# throws away a https-connection
+BOT_POOL_HEADROOM = 4
+
+# maximum length of a telegram-message, longer digests get split
+MAX_MESSAGE_LENGTH = 4096
+
+# The outbox holds every message until it got delivered. Workers claim the
+# messages in batches for the duration of the lease, if a worker dies the
+# messages get claimed again after the lease expired
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_LEASE = 300
+
+# every claim counts as an attempt, a message that was claimed this often
+# without getting delivered is marked as failed
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETENTION = 7 * 24 * 60 * 60
+
+# seconds a delivery-worker waits before it looks for new messages again,
+# if the outbox was empty
+DELIVERY_POLL_INTERVAL = 5
+
 DASHBOARD_URL_PREFIX = "https://info.gesundheitsministerium.at/data/"
 TOTAL_TESTS_URL = "GesamtzahlTestungen.js"
 TOTAL_POSITIV_URL = "PositivGetestet.js"
@@ -26,6 +90,37 @@ TOTAL_NORMAL_BEDS_URL = "GesamtzahlNormalbettenVerf.js"
 AGE_DISTRIBUTION = "Altersverteilung.js"
 REGION_DISTRIBUTION = "Bundesland.js"
 
+# the files every statistics-command needs
+AGE_DISTRIBUTION_URLS = [AGE_DISTRIBUTION, TOTAL_POSITIV_URL]
+REGION_DISTRIBUTION_URLS = [REGION_DISTRIBUTION, CURRENT_POSITIV_URL]
+
+# number of search-results the region-index keeps
+REGION_SEARCH_CACHE_SIZE = 1024
+
+# the most regions a search returns
+REGION_SEARCH_LIMIT = 100
+
+# number of regions on one page of a keyboard. Results with more pages are
+# kept for paging for REGION_RESULTS_TTL seconds
+KEYBOARD_PAGE_SIZE = 8
+REGION_RESULTS_TTL = 10 * 60
+REGION_RESULTS_SIZE = 1000
+
+# seconds between two checks of the subscription-index against the database
+SUBSCRIPTION_RECONCILE_INTERVAL = 15 * 60
+
+# telegram accepts at most 64 bytes of callback-data per button
+CALLBACK_DATA_LIMIT = 64
+
+# backends for the region-search, the in-memory index or the full-text index
+# of the database. Chosen with "region_search" in the config
+REGION_SEARCH_MEMORY = "memory"
+REGION_SEARCH_FTS = "fts"
+
+# a snapshot has to be at least this old, in seconds, to be compared with
+# the current data as "yesterday"
+SNAPSHOT_COMPARE_AGE = 24 * 60 * 60
+
 
 REGION_TRANSLATION = {"W": "Wien",
                       "V": "Vorarlberg",
@@ -39,7 +134,6 @@ REGION_TRANSLATION = {"W": "Wien",
 
 
 EPIDEMIC_OVERVIEW_URLS = [
-    TOTAL_TESTS_URL,
     TOTAL_TESTS_URL,
     TOTAL_POSITIV_URL,
     CURRENT_POSITIV_URL,
@@ -51,10 +145,16 @@ EPIDEMIC_OVERVIEW_URLS = [
     TOTAL_NORMAL_BEDS_URL,
 ]
 
+# every file of the dashboard the bot uses, these get saved as snapshots
+DASHBOARD_URLS = list(dict.fromkeys(EPIDEMIC_OVERVIEW_URLS +
+                                    AGE_DISTRIBUTION_URLS +
+                                    REGION_DISTRIBUTION_URLS))
+
 CONFIG_FILE = "static/config.json"
 
 TELEGRAM_BOT_LOG = "static/corona_bot_log_{date}.log"
 DATA_BUILDER_LOG = "static/corona_data_builder_{date}.log"
+DELIVERY_WORKER_LOG = "static/corona_delivery_worker_{shard}_{date}.log"
 
 ALERT_URL = {
     1: "https://corona-ampel.gv.at/ampelfarben/geringes-risiko-gruen/",
@@ -79,7 +179,6 @@ class Logging():
     CREATING_TABLES = "Creating tables ..."
     TABLES_CREATED = "Tables created!"
 
-    INSERT_SUCCESS = "Inserted {region_name} into the region-table"
 
     REGISTERED_USER = "Registered new user {name}(ID: {id})"
 
@@ -95,77 +194,215 @@ class Logging():
 
     USER_SEND_MSG = "User {username} send the following message: {msg}"
 
-    USER_UPDATE = "Inform {username} about the update in region {region_name}"
-
-    NO_NEW_REGIONS = "All regions are in the database, no need to ingest them"
-    NEW_REGIONS = "Missing regions found, check all Database-entrys"
+    USER_UPDATE = ("Inform chat {chat_id} about the update in region "
+                   "{region_name}")
+
+    DELIVERY_RETRY = ("Delivery to {chat_id} failed ({error}), retrying "
+                      "in {delay:.1f}s")
+    DELIVERY_FAILED = "Delivery to {chat_id} failed: {error}"
+    OUTBOX_ENQUEUED = "Put {count} messages into the outbox"
+    OUTBOX_CLAIMED = "{owner} claimed {count} messages from the outbox"
+    OUTBOX_RELEASED = "{owner} released {count} messages of the outbox"
+    OUTBOX_EXHAUSTED = ("Gave up on {count} messages of the outbox after "
+                        "{attempts} attempts")
+
+    WORKER_STARTED = ("Delivery-worker {owner} started (shard {shard} of "
+                      "{shards})")
+    WORKER_STOPPING = "Delivery-worker {owner} is stopping ..."
+    WORKER_STOPPED = "Delivery-worker {owner} stopped"
+    INVALID_SHARD = ("Invalid shard {shard}, expected index/count with "
+                     "0 <= index < count")
+    RATE_OVER_BUDGET = ("--rate {rate} times {shards} shards exceeds the "
+                        "budget of {budget} messages per second of the bot, "
+                        "use at most {share}")
+    SCHEMA_OUTDATED = ("The database is at schema-version {version}, start "
+                       "the bot once to migrate it")
+
+    DELIVERY_STATS = ("Delivery: {sent} sent, {failed} failed, {retried} "
+                      "retried, {pruned} chats pruned, {dropped} dropped, "
+                      "{queued} queued, "
+                      "{throughput:.1f} msg/s")
+
+    CHAT_PRUNED = ("Chat {chat_id} is gone ({error}), it gets no more "
+                   "alerts until it sends a command again")
+    CHAT_REACTIVATED = "Chat {chat_id} sent a command, it is active again"
+
+    JS_PARSE_ERROR = ("Expected a declaration at position {position}: "
+                      "{text!r}")
+
+    DASHBOARD_SNAPSHOT_SAVED = ("Saved version {version} of the "
+                                "dashboard-file {url}")
+    DASHBOARD_WARM_START = ("Loaded {count} dashboard-files from the "
+                            "database")
+
+    REGION_SEARCH_BUILT = "Filled the region-search with {count} regions"
+
+    REGION_INDEX_BUILT = ("Built the region-index over {count} "
+                          "municipalities (hash {hash})")
+    REGION_NAMES_LOADED = "Loaded the names of {count} regions (hash {hash})"
+
+    INVALID_CALLBACK = "Ignored the invalid callback-data {data!r}"
+
+    SUBSCRIPTIONS_LOADED = ("Loaded {subscriptions} subscriptions of {users} "
+                            "users to {regions} regions")
+    SUBSCRIPTIONS_DRIFT = ("The subscription-index differed from the "
+                           "database for {count} users, reloaded it")
+
+    CACHE_REFRESH_FAILED = ("Refreshing {key} failed ({error}), serving the "
+                            "value from {age:.0f}s ago")
+    CACHE_STATS = ("Dashboard-cache: {size} entries, {hits} hits, {misses} "
+                   "misses ({coalesced} coalesced), {stale} stale, "
+                   "{refreshes} refreshes, {errors} errors, oldest entry "
+                   "{max_age:.0f}s")
+
+    NO_NEW_REGIONS = ("The regions did not change since the last sync "
+                      "(hash {hash}), no need to ingest them")
+    NEW_REGIONS = ("Synced the regions: {inserted} inserted, {renamed} "
+                   "renamed, {removed} removed")
 
     TIMESTAMP_IN_DB = ("This update timestamp {datetimestring} is already in "
                        "the database, skipping changes ...")
     TIMESTAMP_NOT_IN_DB = ("This update timestamp {datetimestring} is not in "
                            "the database, ingesting ...")
 
+    NOT_MODIFIED = "{url} was not modified since the last run, skipping it"
+    DOWNLOADED = "Downloaded {url} to {path}"
+
+    MIGRATING = "Migrating the database to version {version}: {name} ..."
+    MIGRATED = "Database is at schema version {version}"
+
+    TABLE_SCAN = "The query [{query}] falls back to a table scan: {detail}"
+
+    SNAPSHOT_INGESTED = ("Ingested snapshot {datetimestring}: {warnings} "
+                         "warnings, {updates} updates")
+
 
 class Database():
     '''Used for inserting and Loggging database events'''
-    QUERY_EXECUTED = "Quarry [{quary}] successfull executes"
+    QUERY_EXECUTED = "Quarry [{quary}] {params} successfull executes"
 
     EXCEPTION_MSG = ("An {exc_name} occured while executing the Quarry "
-                     "[{quary}] ")
+                     "[{quary}] {params}")
 
     DB_ERROR = "database error"
 
     OP_ERROR = "operational error"
 
-    REGION_CHECK = ("SELECT * FROM regions WHERE (id={id} AND type='{type}' "
-                    "AND name='{name}');")
+    GET_REGIONS = "SELECT id, type, name FROM regions;"
 
-    INSERT_REGION = ("INSERT INTO regions "
+    UPSERT_REGION = ("INSERT INTO regions "
                      "(id, type, name) "
-                     "VALUES ({id}, '{type}', '{name}');")
+                     "VALUES (?, ?, ?) "
+                     "ON CONFLICT(id) DO UPDATE SET "
+                     "type = excluded.type, name = excluded.name;")
+
+    DELETE_REGION = "DELETE FROM regions WHERE id = ?;"
+
+    GET_SYNC_HASH = "SELECT hash FROM sync_state WHERE name = :name;"
+
+    SET_SYNC_HASH = ("INSERT INTO sync_state (name, hash) "
+                     "VALUES (:name, :hash) "
+                     "ON CONFLICT(name) DO UPDATE SET hash = excluded.hash;")
+
+    # the etag and last-modified header of the last ingested response of a
+    # file, stored under its url
+    GET_SYNC_VALIDATORS = ("SELECT etag, last_modified FROM sync_state "
+                           "WHERE name = :name;")
+
+    SET_SYNC_VALIDATORS = ("INSERT INTO sync_state (name, etag, "
+                           "last_modified) "
+                           "VALUES (:name, :etag, :last_modified) "
+                           "ON CONFLICT(name) DO UPDATE SET "
+                           "etag = excluded.etag, "
+                           "last_modified = excluded.last_modified;")
 
     CHECK_WARNING = ("SELECT revision, kw, regions_id, alert_level, reason "
                      "FROM warnings "
-                     "WHERE (regions_id={region_id}) "
+                     "WHERE (regions_id = :region_id) "
                      "ORDER BY revision DESC;")
 
-    INSERT_WARNING = ("INSERT INTO warnings "
-                      "(revision, kw, regions_id, alert_level, reason) "
-                      "VALUES ({revision}, {kw}, {region_id}, {alert_level}, "
-                      "'{reason}');")
-    ADD_UPDATE = ("INSERT INTO updates "
-                  "(region_id, telegram) VALUES "
-                  "({region_id}, 0);")
+    # Used by the bulk-ingest, the latest revision of every region gets
+    # loaded once and the new rows get written with executemany
+    GET_LATEST_WARNINGS = ("SELECT regions_id, MAX(revision), alert_level "
+                           "FROM warnings "
+                           "GROUP BY regions_id;")
+
+    GET_UPDATE_TIMES = "SELECT time_str FROM update_times;"
+
+    BULK_INSERT_WARNING = ("INSERT INTO warnings "
+                           "(revision, kw, regions_id, alert_level, reason) "
+                           "VALUES (?, ?, ?, ?, ?);")
 
-    REGIONS_QUERY = ("select regions.name, regions.id "
-                     "from users, regions, subscriptions "
-                     "where (subscriptions.regions_id = regions.id "
-                     "and subscriptions.users_id = {user_id} "
-                     "and subscriptions.users_id = users.id);")
+    BULK_ADD_UPDATE = ("INSERT INTO updates "
+                       "(region_id, telegram) VALUES "
+                       "(?, 0);")
 
-    SEARCH_REGIONS = ("select name, id from regions where name like "
-                      "'%{region_name}%' "
-                      "and type = 'Gemeinde';")
+    BULK_INSERT_UPDATE_TIME = ("insert into update_times (time_str) VALUES "
+                               "(?);")
 
-    LOOKUP_USER = "select id from users where users.id = {user_id};"
+    # every region with the name of its district, the first three digits
+    # of the GKZ of a Gemeinde are the GKZ of its Bezirk
+    GET_REGIONS_WITH_DISTRICT = ("SELECT regions.id, regions.name, "
+                                 "regions.type, districts.name "
+                                 "FROM regions "
+                                 "LEFT JOIN regions AS districts "
+                                 "ON districts.id = regions.id / 100 "
+                                 "AND districts.type = 'Bezirk';")
+
+    GET_MUNICIPALITIES = ("SELECT regions.id, regions.name, regions.type, "
+                          "districts.name "
+                          "FROM regions "
+                          "LEFT JOIN regions AS districts "
+                          "ON districts.id = regions.id / 100 "
+                          "AND districts.type = 'Bezirk' "
+                          "WHERE regions.type = 'Gemeinde';")
+
+    GET_REGION_NAMES = "SELECT id, name FROM regions;"
+
+    # :query is a fts5-query over the folded names, see region_index
+    SEARCH_REGIONS = ("SELECT name, rowid, type, district FROM regions_fts "
+                      "WHERE regions_fts MATCH :query AND type = :type "
+                      "ORDER BY bm25(regions_fts) LIMIT :limit;")
+
+    COUNT_REGION_SEARCH = "SELECT count(*) FROM regions_fts;"
+
+    COUNT_REGIONS = "SELECT count(*) FROM regions;"
+
+    CLEAR_REGION_SEARCH = "DELETE FROM regions_fts;"
+
+    BULK_INSERT_REGION_SEARCH = ("INSERT INTO regions_fts "
+                                 "(rowid, name, type, district, folded) "
+                                 "VALUES (?, ?, ?, ?, ?);")
+
+    LOOKUP_USER = "select id from users where users.id = :user_id;"
+
+    LOOKUP_USER_ACTIVE = "select active from users where id = :user_id;"
+
+    # chats that blocked the bot or got deleted are marked as inactive and
+    # skipped by the fan-out until they send a command again
+    DEACTIVATE_USER = ("UPDATE users SET active = 0 "
+                       "WHERE id = :user_id AND active = 1;")
+
+    ACTIVATE_USER = ("UPDATE users SET active = 1 "
+                     "WHERE id = :user_id AND active = 0;")
 
     INSERT_USER = ("insert into users "
                    "(id, name) values "
-                   "({id}, '{name}');")
+                   "(:id, :name);")
 
     SUB_USER_REGION_LOOKUP = ("select id from subscriptions "
-                              "where users_id = {user_id} "
-                              "and regions_id = {region_id}")
+                              "where users_id = :user_id "
+                              "and regions_id = :region_id")
 
     SUB_USER_REGION_INSERT = ("insert into subscriptions "
                               "(users_id, regions_id) values "
-                              "({user_id}, {region_id});")
+                              "(:user_id, :region_id);")
     UBSUB_USER_REGION = ("DELETE FROM subscriptions "
-                         "WHERE (subscriptions.regions_id = {region_id} "
-                         "and subscriptions.users_id = {user_id});")
+                         "WHERE (subscriptions.regions_id = :region_id "
+                         "and subscriptions.users_id = :user_id);")
 
     UBSUB_USER_ALL_REGION = ("DELETE FROM subscriptions "
-                             "WHERE (subscriptions.users_id = {user_id});")
+                             "WHERE (subscriptions.users_id = :user_id);")
 
     CREATE_REGIONS_TABLE = ("CREATE TABLE IF NOT EXISTS regions ("
                             "id INTEGER PRIMARY KEY, "
@@ -199,47 +436,271 @@ class Database():
                                   "REFERENCES "
                                   "regions(id));")
 
+    CREATE_SYNC_STATE_TABLE = ("CREATE TABLE IF NOT EXISTS sync_state ("
+                               "name TEXT PRIMARY KEY, "
+                               "hash TEXT);")
+
     CREATE_UPDATES_TABLE = ("CREATE TABLE IF NOT EXISTS updates ("
                             "id INTEGER PRIMARY KEY AUTOINCREMENT, "
                             "region_id INTEGER, "
                             "telegram INTEGER);")
 
-    GET_UPDATED_REGIONS = "select region_id from updates where telegram = 0;"
-
-    GET_REGIONUPDATES = ("select regions.name, warnings.alert_level from "
-                         "warnings , regions "
-                         "where (warnings.regions_id = {id} and "
-                         "warnings.regions_id = regions.id) "
-                         "order by warnings.revision DESC "
-                         "Limit 2;")
+    # Migration 2: integer affinity for warnings.regions_id, indexes for the
+    # hot lookups and unique constraints
+    CREATE_WARNINGS_TABLE_V2 = ("CREATE TABLE warnings_v2 ("
+                                "revision INTEGER, "
+                                "kw INTEGER, "
+                                "regions_id INTEGER, "
+                                "alert_level INTEGER, "
+                                "reason TEXT, "
+                                "PRIMARY KEY(regions_id, revision, kw), "
+                                "FOREIGN KEY(regions_id) "
+                                "REFERENCES regions(id));")
+
+    COPY_WARNINGS_TABLE_V2 = ("INSERT INTO warnings_v2 "
+                              "(revision, kw, regions_id, alert_level, "
+                              "reason) "
+                              "SELECT revision, kw, "
+                              "CAST(regions_id AS INTEGER), alert_level, "
+                              "reason FROM warnings;")
+
+    DROP_WARNINGS_TABLE = "DROP TABLE warnings;"
+
+    RENAME_WARNINGS_TABLE_V2 = "ALTER TABLE warnings_v2 RENAME TO warnings;"
+
+    DEDUPLICATE_SUBSCRIPTIONS = ("DELETE FROM subscriptions WHERE id NOT IN "
+                                 "(SELECT MIN(id) FROM subscriptions "
+                                 "GROUP BY users_id, regions_id);")
+
+    CREATE_SUBSCRIPTIONS_USER_INDEX = ("CREATE UNIQUE INDEX IF NOT EXISTS "
+                                       "idx_subscriptions_user_region "
+                                       "ON subscriptions "
+                                       "(users_id, regions_id);")
+
+    CREATE_SUBSCRIPTIONS_REGION_INDEX = ("CREATE INDEX IF NOT EXISTS "
+                                         "idx_subscriptions_region "
+                                         "ON subscriptions (regions_id);")
+
+    CREATE_UPDATES_PENDING_INDEX = ("CREATE INDEX IF NOT EXISTS "
+                                    "idx_updates_pending "
+                                    "ON updates (telegram, region_id);")
+
+    CREATE_UPDATES_REGION_INDEX = ("CREATE INDEX IF NOT EXISTS "
+                                   "idx_updates_region "
+                                   "ON updates (region_id);")
+
+    DEDUPLICATE_UPDATE_TIMES = ("DELETE FROM update_times WHERE id NOT IN "
+                                "(SELECT MIN(id) FROM update_times "
+                                "GROUP BY time_str);")
+
+    CREATE_UPDATE_TIMES_INDEX = ("CREATE UNIQUE INDEX IF NOT EXISTS "
+                                 "idx_update_times_time_str "
+                                 "ON update_times (time_str);")
+
+    # Transactions and savepoints, used by utils.transaction. The write-lock
+    # is taken at the start, so a transaction never fails while upgrading
+    # from a read- to a write-lock
+    BEGIN_TRANSACTION = "BEGIN IMMEDIATE;"
+    COMMIT_TRANSACTION = "COMMIT;"
+    ROLLBACK_TRANSACTION = "ROLLBACK;"
+    SAVEPOINT = "SAVEPOINT sp_{depth:d};"
+    RELEASE_SAVEPOINT = "RELEASE SAVEPOINT sp_{depth:d};"
+    ROLLBACK_SAVEPOINT = "ROLLBACK TO SAVEPOINT sp_{depth:d};"
+
+    # Pragmas for every connection, WAL lets readers continue while the
+    # data_builder or the bot is writing. NORMAL is durable in WAL-mode,
+    # only the last transactions may be lost on a power loss
+    CONNECTION_PRAGMAS = [
+        "PRAGMA journal_mode = WAL;",
+        "PRAGMA synchronous = NORMAL;",
+        "PRAGMA temp_store = MEMORY;",
+        "PRAGMA cache_size = -8000;",
+    ]
+
+    READ_ONLY_PRAGMA = "PRAGMA query_only = ON;"
+
+    # Migration 3: outbox for the alert-messages, state is 0 for pending,
+    # 1 for delivered and 2 for messages that can not be delivered
+    CREATE_OUTBOX_TABLE = ("CREATE TABLE IF NOT EXISTS outbox ("
+                           "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                           "chat_id INTEGER NOT NULL, "
+                           "message TEXT NOT NULL, "
+                           "state INTEGER NOT NULL DEFAULT 0, "
+                           "created REAL NOT NULL, "
+                           "lease_owner TEXT, "
+                           "lease_expires REAL);")
+
+    CREATE_OUTBOX_PENDING_INDEX = ("CREATE INDEX IF NOT EXISTS "
+                                   "idx_outbox_pending "
+                                   "ON outbox (id) WHERE state = 0;")
+
+    CREATE_OUTBOX_LEASE_INDEX = ("CREATE INDEX IF NOT EXISTS "
+                                 "idx_outbox_lease "
+                                 "ON outbox (lease_owner, lease_expires) "
+                                 "WHERE state = 0;")
+
+    # every version of a dashboard-file is stored once as compact json, the
+    # url is the name of the file without the prefix
+    CREATE_DASHBOARD_SNAPSHOTS_TABLE = (
+        "CREATE TABLE IF NOT EXISTS dashboard_snapshots ("
+        "url TEXT NOT NULL, "
+        "version TEXT NOT NULL, "
+        "fetched REAL NOT NULL, "
+        "data TEXT NOT NULL, "
+        "PRIMARY KEY (url, version)) WITHOUT ROWID;")
+
+    CREATE_DASHBOARD_SNAPSHOTS_INDEX = ("CREATE INDEX IF NOT EXISTS "
+                                        "idx_dashboard_snapshots_fetched "
+                                        "ON dashboard_snapshots "
+                                        "(url, fetched);")
+
+    # full-text index over the regions, the rowid is the id of the region.
+    # Only the folded name is searchable, the other columns are returned
+    CREATE_REGIONS_FTS_TABLE = ("CREATE VIRTUAL TABLE IF NOT EXISTS "
+                                "regions_fts USING fts5("
+                                "name UNINDEXED, type UNINDEXED, "
+                                "district UNINDEXED, folded, "
+                                "tokenize = 'unicode61');")
+
+    # forces the next sync to fill the full-text index
+    RESET_REGIONS_SYNC_HASH = ("DELETE FROM sync_state "
+                               "WHERE name = 'regions';")
+
+    ADD_SYNC_STATE_ETAG_COLUMN = ("ALTER TABLE sync_state "
+                                  "ADD COLUMN etag TEXT;")
+
+    ADD_SYNC_STATE_LAST_MODIFIED_COLUMN = ("ALTER TABLE sync_state "
+                                           "ADD COLUMN last_modified TEXT;")
+
+    ADD_OUTBOX_ATTEMPTS_COLUMN = ("ALTER TABLE outbox "
+                                  "ADD COLUMN attempts INTEGER NOT NULL "
+                                  "DEFAULT 0;")
+
+    ADD_USERS_ACTIVE_COLUMN = ("ALTER TABLE users "
+                               "ADD COLUMN active INTEGER NOT NULL "
+                               "DEFAULT 1;")
+
+    CREATE_OUTBOX_CREATED_INDEX = ("CREATE INDEX IF NOT EXISTS "
+                                   "idx_outbox_created "
+                                   "ON outbox (created) WHERE state <> 0;")
+
+    GET_SCHEMA_VERSION = "PRAGMA user_version;"
+
+    # PRAGMA-statements do not support parameters
+    SET_SCHEMA_VERSION = "PRAGMA user_version = {version:d};"
+
+    EXPLAIN_QUERY_PLAN = "EXPLAIN QUERY PLAN {query}"
+
+    GET_TABLE_NAMES = "SELECT name FROM sqlite_master WHERE type = 'table';"
+
+    GET_LAST_PENDING_UPDATE = ("select max(id) from updates "
+                               "where telegram = 0;")
+
+    # All pending level-changes in one query, one row per updated region:
+    # (region_id, region_name, old_level, new_level). The subscribers come
+    # from the subscription-index. Only updates up to :last_update are used,
+    # so that updates arriving in the meantime are not marked as read
+    GET_PENDING_LEVEL_CHANGES = (
+        "WITH pending AS ("
+        "SELECT DISTINCT region_id FROM updates "
+        "WHERE telegram = 0 AND id <= :last_update), "
+        "levels AS ("
+        "SELECT region_id, "
+        "MAX(CASE WHEN position = 1 THEN alert_level END) AS new_level, "
+        "MAX(CASE WHEN position = 2 THEN alert_level END) AS old_level "
+        "FROM (SELECT warnings.regions_id AS region_id, "
+        "warnings.alert_level AS alert_level, "
+        "ROW_NUMBER() OVER (PARTITION BY warnings.regions_id "
+        "ORDER BY warnings.revision DESC) AS position "
+        "FROM warnings "
+        "WHERE warnings.regions_id IN (SELECT region_id FROM pending)) "
+        "WHERE position <= 2 "
+        "GROUP BY region_id "
+        "HAVING old_level IS NOT NULL) "
+        "SELECT regions.id, regions.name, levels.old_level, "
+        "levels.new_level "
+        "FROM levels "
+        "JOIN regions ON regions.id = levels.region_id "
+        "ORDER BY regions.id;")
+
+    # only used to load and check the subscription-index, see subscriptions
+    GET_ALL_SUBSCRIPTIONS = "SELECT users_id, regions_id FROM subscriptions;"
+    GET_INACTIVE_USERS = "SELECT id FROM users WHERE active = 0;"
+
+    INSERT_OUTBOX = ("INSERT INTO outbox (chat_id, message, created) "
+                     "VALUES (:chat_id, :message, :created);")
+
+    # Claims the oldest pending messages that are not leased by anyone or
+    # whose lease expired. Workers can split the chats into shards, with a
+    # single shard every chat belongs to shard 0. Group-chats have negative
+    # ids, so the shard is taken from the absolute value
+    CLAIM_OUTBOX = ("UPDATE outbox "
+                    "SET lease_owner = :owner, lease_expires = :expires, "
+                    "attempts = attempts + 1 "
+                    "WHERE id IN ("
+                    "SELECT id FROM outbox "
+                    "WHERE state = 0 AND "
+                    "(lease_expires IS NULL OR lease_expires < :now) AND "
+                    "abs(chat_id) % :shards = :shard "
+                    "ORDER BY id LIMIT :limit);")
+
+    GET_CLAIMED_OUTBOX = ("SELECT id, chat_id, message FROM outbox "
+                          "WHERE state = 0 AND lease_owner = :owner "
+                          "AND lease_expires = :expires "
+                          "ORDER BY id;")
+
+    # Gives the messages of a stopping worker back, so that other workers
+    # do not have to wait for the lease to expire
+    RELEASE_OUTBOX = ("UPDATE outbox "
+                      "SET lease_owner = NULL, lease_expires = NULL "
+                      "WHERE state = 0 AND lease_owner = :owner;")
+
+    MARK_OUTBOX_DELIVERED = ("UPDATE outbox SET state = 1 "
+                             "WHERE id = :id AND state = 0;")
+
+    MARK_OUTBOX_FAILED = ("UPDATE outbox SET state = 2 "
+                          "WHERE id = :id AND state = 0;")
+
+    # the other pending messages of a chat that is gone would fail as well
+    FAIL_OUTBOX_CHAT = ("UPDATE outbox SET state = 2 "
+                        "WHERE state = 0 AND chat_id = :chat_id;")
+
+    # messages that were claimed too often without getting delivered, e.g.
+    # after errors that are neither permanent nor retried
+    FAIL_EXHAUSTED_OUTBOX = ("UPDATE outbox SET state = 2 "
+                             "WHERE state = 0 "
+                             "AND attempts >= :max_attempts "
+                             "AND (lease_expires IS NULL "
+                             "OR lease_expires < :now);")
+
+    DELETE_OLD_OUTBOX = ("DELETE FROM outbox "
+                         "WHERE state <> 0 AND created < :before;")
+
+    INSERT_DASHBOARD_SNAPSHOT = ("INSERT OR IGNORE INTO dashboard_snapshots "
+                                 "(url, version, fetched, data) VALUES "
+                                 "(:url, :version, :fetched, :data);")
+
+    # the newest snapshot of a file that was fetched before the given time
+    GET_DASHBOARD_SNAPSHOT = ("SELECT fetched, data "
+                              "FROM dashboard_snapshots "
+                              "WHERE url = :url AND fetched <= :before "
+                              "ORDER BY fetched DESC LIMIT 1;")
+
+    MARK_UPDATES_AS_READ = ("UPDATE updates "
+                            "set telegram = 1 "
+                            "where telegram = 0 and id <= :last_update;")
 
     GET_REGIONUPDATES_ALL = ("select warnings.kw, warnings.alert_level from "
                              "warnings , regions "
-                             "where (warnings.regions_id = {id} and "
+                             "where (warnings.regions_id = :id and "
                              "warnings.regions_id = regions.id) "
                              "order by warnings.revision ASC;")
     '''
     LOOKUP_REGION_SUBSCRIPTIONS = ("select subscriptions.users_id from "
                                    " subscriptions where "
-                                   "subscriptions.regions_id = {region_id}")
+                                   "subscriptions.regions_id = :region_id")
     '''
 
-    LOOKUP_UPDATE_TIME = ("select count(*) from update_times where "
-                          "time_str='{datetimestring}';")
-
-    INSERT_UPDATE_TIME = ("insert into update_times (time_str) VALUES "
-                          "('{datetimestring}');")
-
-    LOOKUP_REGION_SUBSCRIPTIONS = ("select subscriptions.users_id, "
-                                   "users.name  from subscriptions, users "
-                                   "where "
-                                   "subscriptions.regions_id = {region_id} "
-                                   "and subscriptions.users_id = users.id;")
-
-    MARK_UPDATE_AS_READ = ("UPDATE updates "
-                           "set telegram = 1 "
-                           "where region_id = {region_id};")
-
 
 class TelegramConstants():
     '''A class for storing telegram-constant values'''
@@ -251,12 +712,28 @@ class TelegramConstants():
     CMD_UNSUB_ARG = "nothing or <all>"
     CMD_REGHISTORY_ARG = "a city or region"
 
-    CMD_UNSUB_PREFIX = "Unsubscribe"
-    CMD_SUB_PREFIX = "Subscribe"
+    # opcodes of the callback-data, the first character of it. The rest is
+    # the argument, e.g. the base36-encoded GKZ of a region
+    CMD_UNSUB_PREFIX = "u"
+    CMD_SUB_PREFIX = "s"
+    CMD_PAGE_PREFIX = "p"
+    CMD_CANCEL_PREFIX = "c"
+
+    # the prefixes of older buttons, that may still be in the chats
+    LEGACY_PREFIXES = {"Unsubscribe": CMD_UNSUB_PREFIX,
+                       "Subscribe": CMD_SUB_PREFIX,
+                       "Cancel": CMD_CANCEL_PREFIX}
+
+    PAGE_PREVIOUS = "« {page}/{pages}"
+    PAGE_NEXT = "{page}/{pages} »"
     CMD_REGHISTORY_PREFIX = "Regionhistory"
 
     CMD_PREFIX_CANCEL = "Cancel"
 
+    # button of a region in a search-result, the district tells apart
+    # Gemeinden with the same name
+    REGION_BUTTON = "{name} ({district})"
+
     START_MESSAGE = ("Hi 👋, these are the commends I know.\n"
                      "\n"
                      "<b>Subscribing and Unsubscribing</b>\n"
@@ -321,6 +798,12 @@ class TelegramConstants():
         "The gender distribution is {female}% female & {male}% male\n\n"
         "Last update: {update_time}")
 
+    EPIDEMIC_CHANGE = (
+        "\n\n<b>Since yesterday</b>\n"
+        "{tests:+d} tests, {pos_tests:+d} confirmed cases, "
+        "{pos_tests_curr:+d} active cases, {int_care:+d} intensive care "
+        "beds and {care:+d} hospital beds in use")
+
     REGISTERED = "Okay, I have just registered you for {region_name} 😄"
 
     REGISTERED_REGIONS = "Okay, I found the following registrations 😄"
@@ -345,7 +828,13 @@ class TelegramConstants():
                          "This means, the following restrictions apply for "
                          "this area:\n{url_link}")
 
+    # separates the alerts of multiple regions in one message
+    DIGEST_SEPARATOR = "\n\n"
+
     CANCEL_OPERATION = ("Okay, I canceled the current operation 😄")
 
+    RESULTS_EXPIRED = ("Sorry, these results are too old, please search "
+                       "again 🤔")
+
     UNKNOWN_COMMAND = ("Sorry, I don't understand you 😕\n"
                        "Please use /help to get a list of all my commands 😄")
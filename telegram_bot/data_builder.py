@@ -6,16 +6,19 @@ A Programm to ingest covid19 region-data into a sqlite-database for later use
 """
 
 import datetime
+import hashlib
 import json
 import logging
-import sqlite3
+import os
 
 import requests
 
 import constants as const
 from constants import Database as db_const
 from constants import Logging as logg_const
-from utils import execute_query
+import migrations
+import region_index
+from utils import connect, fetch_one, transaction
 
 
 def create_database(sql_path):
@@ -23,18 +26,15 @@ def create_database(sql_path):
 
     #  creation and connection to the database
     logging.info(logg_const.CREATING_DATABASE)
-    sqlite_connection = sqlite3.connect(sql_path)
+    sqlite_connection = connect(sql_path)
     logging.info(logg_const.DATABASE_CREATED)
 
-    #  building the tables if necessary
+    #  building the tables and migrating them to the latest schema if
+    #  necessary
     logging.info(logg_const.CREATING_TABLES)
 
-    execute_query(sqlite_connection, db_const.CREATE_REGIONS_TABLE)
-    execute_query(sqlite_connection, db_const.CREATE_WARNINGS_TABLE)
-    execute_query(sqlite_connection, db_const.CREATE_USERS_TABLE)
-    execute_query(sqlite_connection, db_const.CREATE_SUBSCRIPTIONS_TABLE)
-    execute_query(sqlite_connection, db_const.CREATE_UPDATES_TABLE)
-    execute_query(sqlite_connection, db_const.CREATE_TABLE_UPDATE_TIMES)
+    migrations.migrate(sqlite_connection)
+    migrations.check_query_plans(sqlite_connection)
 
     logging.info(logg_const.TABLES_CREATED)
 
@@ -42,172 +42,382 @@ def create_database(sql_path):
     return sqlite_connection
 
 
-def get_corona_data(url):
-    '''Get the data provided by the corona-ampel json file'''
+def get_cache_paths(url, cache_dir):
+    '''Returns the paths of the cached body and header-file of an url'''
+    base = os.path.join(cache_dir,
+                        hashlib.sha1(url.encode("utf-8")).hexdigest())
 
-    # create a get-request to the server to get the file
-    req = requests.get(url)
+    # body, validators of the body that is not ingested yet
+    return base + ".body", base + ".pending.json"
 
-    # read it and pare it as a text-file
-    response_json = req.text
-    json_response = json.loads(response_json)
+
+def fetch_if_modified(sql_connection, url, cache_dir=const.RESPONSE_CACHE_DIR,
+                      session=requests):
+    """
+    Download the url with a conditional request, returns the path to the
+    body on disk or None if the file did not change since the last ingest
+    into the database
+    """
+    body_path, pending_path = get_cache_paths(url, cache_dir)
+
+    # send the validators of the response last ingested into this database,
+    # a new database has none and gets the whole file
+    headers = {}
+    validators = fetch_one(sql_connection, db_const.GET_SYNC_VALIDATORS,
+                           {"name": url})
+
+    if validators is not None:
+        etag, last_modified = validators
+
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+
+    req = session.get(url, headers=headers, stream=True,
+                      timeout=const.HTTP_TIMEOUT)
+
+    # nothing changed, there is no need to parse or ingest anything
+    if req.status_code == 304:
+        req.close()
+        logging.info(logg_const.NOT_MODIFIED.format(url=url))
+        return None
+
+    req.raise_for_status()
+
+    # write the body to disk, replacing the old one only once it is complete
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(body_path + ".tmp", "wb") as file:
+        for chunk in req.iter_content(chunk_size=const.HTTP_CHUNK_SIZE):
+            file.write(chunk)
+    os.replace(body_path + ".tmp", body_path)
+
+    # the validators are only stored as pending, they become active once the
+    # body got ingested, so a failed ingest gets repeated on the next run
+    with open(pending_path, "w") as file:
+        file.write(json.dumps({
+            "etag": req.headers.get("ETag"),
+            "last_modified": req.headers.get("Last-Modified")}))
+
+    logging.info(logg_const.DOWNLOADED.format(url=url, path=body_path))
+
+    return body_path
+
+
+def mark_fetch_ingested(sql_connection, url,
+                        cache_dir=const.RESPONSE_CACHE_DIR):
+    """
+    Activates the validators of the last download of the url, they are
+    stored in the database the body got ingested into
+    """
+    _, pending_path = get_cache_paths(url, cache_dir)
+
+    if not os.path.exists(pending_path):
+        return
+
+    # the pending file holds the etag and last_modified of the body
+    with open(pending_path, "r") as file:
+        validators = json.loads(file.read())
+    validators["name"] = url
+
+    with transaction(sql_connection):
+        sql_connection.execute(db_const.SET_SYNC_VALIDATORS, validators)
+
+    os.remove(pending_path)
+
+
+def get_corona_data(sql_connection, url, cache_dir=const.RESPONSE_CACHE_DIR,
+                    session=requests):
+    """
+    Get the data provided by the corona-ampel json file, returns None if
+    the file did not change since the last ingest
+    """
+
+    # create a conditional get-request to the server to get the file
+    body_path = fetch_if_modified(sql_connection, url, cache_dir, session)
+
+    if body_path is None:
+        return None
+
+    # read it and parse it as a json-file
+    with open(body_path, "r", encoding="utf-8") as file:
+        json_response = json.load(file)
 
     # return the parsed json-document
     return json_response
 
 
-def insert_regions(sql_connection, json_response):
-    '''Function to insert the region-data into the region-table'''
+# the characters that can follow an element of an array
+END_OF_ELEMENT = (" ", "\t", "\r", "\n", ",", "]")
+
+
+def iter_json_array(file, chunk_size=const.HTTP_CHUNK_SIZE):
+    """
+    Incrementally decode the elements of a top-level json-array from a
+    text-stream, only one element is held in memory at a time
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    # what has to come next: the "[", an element (or "]" right after the
+    # "["), or the "," or "]" behind an element
+    expected = "["
+
+    while True:
+        buffer = buffer.lstrip(" \t\r\n")
+
+        if buffer and expected == "[":
+            if buffer[0] != "[":
+                raise json.JSONDecodeError("Expected '['", buffer, 0)
+            buffer = buffer[1:]
+            expected = "first"
+            continue
+
+        if buffer and expected == "separator":
+            if buffer[0] == "]":
+                return
+            if buffer[0] != ",":
+                raise json.JSONDecodeError("Expected ',' or ']'", buffer, 0)
+            buffer = buffer[1:]
+            expected = "element"
+            continue
+
+        if buffer and expected == "first" and buffer[0] == "]":
+            return
+
+        if buffer and expected in ("first", "element"):
+            # try to decode the next element, if it is not complete yet,
+            # more data has to be read. A number cut off by the chunk ("12"
+            # of "12.5") decodes fine, so an element is only taken if a
+            # separator follows it or the file ended
+            try:
+                element, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                if eof or buffer[end:end + 1] in END_OF_ELEMENT:
+                    yield element
+                    buffer = buffer[end:]
+                    expected = "separator"
+                    continue
 
-    new_regions_found = False
+        if eof:
+            raise json.JSONDecodeError("Unterminated array", buffer, 0)
 
-    # check if the number of entrys in the database matches the number of
-    # entrys in the response
-    lookup_regioncount = "Select Count(*) from regions"
-    lookup_result = execute_query(sql_connection, lookup_regioncount)
+        # read at least as much as is already buffered, so that large
+        # elements do not get decoded over and over again
+        chunk = file.read(max(chunk_size, len(buffer)))
+        if not chunk:
+            eof = True
+        buffer += chunk
 
-    if lookup_result is not None:
-        # if the result matches the number of regons in the file, than
-        # there is nothing to ingest
-        if lookup_result[0][0] == len(json_response["Regionen"]):
-            logging.info(logg_const.NO_NEW_REGIONS)
 
-            return new_regions_found
-        else:
-            new_regions_found = True
+def get_corona_snapshots(sql_connection, url,
+                         cache_dir=const.RESPONSE_CACHE_DIR,
+                         session=requests):
+    """
+    Get the warning-snapshots of the corona-ampel json file one by one,
+    returns None if the file did not change since the last ingest
+    """
+    body_path = fetch_if_modified(sql_connection, url, cache_dir, session)
 
-    logging.info(logg_const.NEW_REGIONS)
+    if body_path is None:
+        return None
 
-    # iterate over all items in the regions-set, this contains Bundesländer,
-    # Gemeinden, Bezirke
+    return stream_snapshots(body_path)
+
+
+def stream_snapshots(path):
+    '''Yields the snapshots of a warnings-file stored on disk'''
+    with open(path, "r", encoding="utf-8") as file:
+        yield from iter_json_array(file)
+
+
+def sync_region_search(sql_connection):
+    """
+    Fills the full-text index if it does not hold every region, e.g. after
+    the migration that created it. Returns True if it got filled
+    """
+    with transaction(sql_connection):
+        search_count = fetch_one(sql_connection,
+                                 db_const.COUNT_REGION_SEARCH)[0]
+        region_count = fetch_one(sql_connection, db_const.COUNT_REGIONS)[0]
+
+        if search_count == region_count:
+            return False
+
+        region_index.fill_region_search(sql_connection)
+
+    return True
+
+
+def insert_regions(sql_connection, json_response):
+    '''
+    Function to sync the region-data with the region-table, returns the
+    number of changed rows
+    '''
+
+    # the full-text index may be empty even if the regions did not change
+    sync_region_search(sql_connection)
+
+    # hash the region-payload, if it matches the hash of the last sync, than
+    # there is nothing to ingest
+    payload = json.dumps(json_response["Regionen"], sort_keys=True)
+    payload_hash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    result = fetch_one(sql_connection, db_const.GET_SYNC_HASH,
+                       {"name": const.REGIONS_SYNC_NAME})
+
+    if result is not None and result[0] == payload_hash:
+        logging.info(logg_const.NO_NEW_REGIONS.format(hash=payload_hash))
+        return 0
+
+    # build a lookup of the regions in the payload, this contains
+    # Bundesländer, Gemeinden, Bezirke
+    new_regions = {}
     for region in json_response["Regionen"]:
+        new_regions[int(region['GKZ'])] = (region['Region'], region['Name'])
+
+    # and of the regions already in the database
+    old_regions = {}
+    for region_id, region_type, region_name in sql_connection.execute(
+            db_const.GET_REGIONS):
+        old_regions[region_id] = (region_type, region_name)
+
+    # compare both sets, only rows that differ have to be written
+    inserted = [region_id for region_id in new_regions
+                if region_id not in old_regions]
+    renamed = [region_id for region_id in new_regions
+               if region_id in old_regions and
+               old_regions[region_id] != new_regions[region_id]]
+    removed = [region_id for region_id in old_regions
+               if region_id not in new_regions]
 
-        # check if the region already exists in the database
-        region_check = db_const.REGION_CHECK.format(id=int(region['GKZ']),
-                                                    type=region['Region'],
-                                                    name=region['Name'])
-        result = execute_query(sql_connection, region_check)
+    upsert_rows = [(region_id,) + new_regions[region_id]
+                   for region_id in inserted + renamed]
 
-        # if not, it will be inserted
-        if len(result) == 0:
-            region_gkz = int(region['GKZ'])
-            region_type = region['Region']
-            region_name = region['Name']
-            insert_region = db_const.INSERT_REGION.format(id=region_gkz,
-                                                          type=region_type,
-                                                          name=region_name)
+    # apply all changes and the new hash in a single transaction
+    with transaction(sql_connection):
+        sql_connection.executemany(db_const.UPSERT_REGION, upsert_rows)
+        sql_connection.executemany(db_const.DELETE_REGION,
+                                   [(region_id,) for region_id in removed])
 
-            execute_query(sql_connection, insert_region)
+        # the full-text index is rebuilt if the regions changed
+        if len(upsert_rows) + len(removed) > 0:
+            region_index.fill_region_search(sql_connection)
 
-            logging.info(
-                logg_const.INSERT_SUCCESS.format(
-                    region_name=region['Name']))
+        sql_connection.execute(db_const.SET_SYNC_HASH,
+                               {"name": const.REGIONS_SYNC_NAME,
+                                "hash": payload_hash})
 
-    return None
+    logging.info(logg_const.NEW_REGIONS.format(inserted=len(inserted),
+                                               renamed=len(renamed),
+                                               removed=len(removed)))
+
+    return len(upsert_rows) + len(removed)
+
+
+def load_latest_warnings(sql_connection):
+    """
+    Load the latest revision and alert-level of every region into a dict,
+    keyed by the id of the region
+    """
+    latest_warnings = {}
+
+    cursor = sql_connection.execute(db_const.GET_LATEST_WARNINGS)
+
+    # result: (regions_id, revision, alert_level), regions_id is stored as
+    # text in older databases, so it gets converted to match the GKZ
+    for region_id, revision, alert_level in cursor:
+        latest_warnings[int(region_id)] = (revision, alert_level)
+
+    return latest_warnings
 
 
 def insert_warnings(sql_connection, json_response, reverse_order=False):
     '''Function to insert the warning-levels into the warning-table'''
 
     inserted_warnings = False
-    update_nr = len(json_response)
 
+    # load the current state once, instead of looking up every region in
+    # every snapshot
+    latest_warnings = load_latest_warnings(sql_connection)
+    known_timestamps = {row[0] for row in sql_connection.execute(
+        db_const.GET_UPDATE_TIMES)}
+
+    # the snapshots may be streamed, so they have to be collected in order
+    # to reverse them
     if reverse_order:
-        update_number_enumerator = reversed(range(0, update_nr))
+        snapshots = reversed(list(json_response))
     else:
-        update_number_enumerator = range(0, update_nr)
+        snapshots = json_response
 
-    for update_number in update_number_enumerator:
+    for snapshot in snapshots:
 
         # get the date fromt he warningentry
-        datestring = json_response[update_number]["Stand"]
+        datestring = snapshot["Stand"]
 
         # check if the timestamp is already in the database
-        lookup_quary = db_const.LOOKUP_UPDATE_TIME.format(
-            datetimestring=datestring)
-
-        result = execute_query(sql_connection, lookup_quary)
-
-        if result[0][0] >= 1:
+        if datestring in known_timestamps:
             # if the timestamp is in the database, continue with the next one
             logging.info(logg_const.TIMESTAMP_IN_DB.format(
                             datetimestring=datestring))
             continue
-        else:
-            # if not, it needs to be ingested and the updates need to be put
-            # into the db
-            logging.info(logg_const.TIMESTAMP_NOT_IN_DB.format(
-                            datetimestring=datestring))
-            insert_quary = db_const.INSERT_UPDATE_TIME.format(
-                datetimestring=datestring)
-            execute_query(sql_connection, insert_quary)
 
-        for region in json_response[update_number]["Warnstufen"]:
-            # Prepared statement to check if the region is already in the table
-            # and order by desc revision to get the latest evrsion
+        # if not, it needs to be ingested and the updates need to be put
+        # into the db
+        logging.info(logg_const.TIMESTAMP_NOT_IN_DB.format(
+                        datetimestring=datestring))
 
-            check_warn = db_const.CHECK_WARNING.format(region_id=region['GKZ'])
+        # the calendar week is the same for every region in the snapshot
+        date = datetime.datetime.strptime(datestring,
+                                          "%Y-%m-%dT%H:%M:%S%z").date()
+        kw = date.isocalendar()[1]
 
-            result = execute_query(sql_connection, check_warn)
+        # collect the rows of the snapshot, they get written all at once
+        warning_rows = []
+        update_rows = []
 
-            # TODO: This should be simplified, since there are quite a few
-            # things identical
-            if len(result) == 0:
-                # Check if the entry is already in the database and if not, it
-                # will be inserted
+        for region in snapshot["Warnstufen"]:
+            level = int(region['Warnstufe'])
+            region_id = int(region['GKZ'])
 
-                # Declare some variables for later use int eh query
-                reason = "Null"
-                level = int(region['Warnstufe'])
-                region_id = int(region['GKZ'])
-
-                date = datetime.datetime.strptime(
-                        datestring,
-                        "%Y-%m-%dT%H:%M:%S%z").date()
-                kw = date.isocalendar()[1]
+            latest = latest_warnings.get(region_id)
 
+            if latest is None:
                 # Insert the first revision of the region to the database,
                 # this is the starting-level
-                warning_data = db_const.INSERT_WARNING.format(
-                    revision=1, kw=kw, region_id=region_id, alert_level=level,
-                    reason=reason)
-                execute_query(sql_connection, warning_data)
-
-                inserted_warnings = True
+                revision = 1
+            elif latest[1] != level:
+                # There is a new alert-level for the region, therefor we
+                # insert it with a new revision and add the region to the
+                # update-list for use by other programs
+                revision = latest[0] + 1
+                update_rows.append((region_id,))
             else:
-                # It is already in the database, lets check if the warning
-                # has changed from last time inserting it
-                # result: (revision, kw, regions_id, alert_level, reason)
-                if result[0][3] != int(region['Warnstufe']):
-                    # define some variables we need to build the query
-                    reason = "Null"
-                    level = int(region['Warnstufe'])
-                    region_id = int(region['GKZ'])
+                # nothing changed since the last snapshot
+                continue
 
-                    date = datetime.datetime.strptime(
-                            datestring,
-                            "%Y-%m-%dT%H:%M:%S%z").date()
+            warning_rows.append((revision, kw, region_id, level, "Null"))
+            latest_warnings[region_id] = (revision, level)
 
-                    kw = date.isocalendar()[1]
+        # write the whole snapshot in a single transaction
+        with transaction(sql_connection):
+            sql_connection.execute(db_const.BULK_INSERT_UPDATE_TIME,
+                                   (datestring,))
+            sql_connection.executemany(db_const.BULK_INSERT_WARNING,
+                                       warning_rows)
+            sql_connection.executemany(db_const.BULK_ADD_UPDATE, update_rows)
 
-                    rev = result[0][0] + 1
+        known_timestamps.add(datestring)
 
-                    # There is a new alert-level for the region, therefor we
-                    # insert it with a new revision
-                    warn_update = db_const.INSERT_WARNING.format(
-                        revision=rev, kw=kw, region_id=region_id,
-                        alert_level=level, reason=reason)
-                    execute_query(sql_connection, warn_update)
+        logging.info(logg_const.SNAPSHOT_INGESTED.format(
+            datetimestring=datestring, warnings=len(warning_rows),
+            updates=len(update_rows)))
 
-                    # Add the region to the update-list for use by other
-                    # programs
-                    region_id = int(region['GKZ'])
-
-                    add_update = db_const.ADD_UPDATE.format(
-                        region_id=region_id)
-                    execute_query(sql_connection, add_update)
-
-                inserted_warnings = True
+        inserted_warnings = True
 
     return inserted_warnings
 
@@ -218,14 +428,32 @@ def main():
     with open(const.CONFIG_FILE, "r") as file:
         configurations = json.loads(file.read())
 
+    cache_dir = configurations.get("response_cache_dir",
+                                   const.RESPONSE_CACHE_DIR)
+
     # create a database connection and build all the tables
     database_con = create_database(configurations["database_path"])
 
-    json_regions = get_corona_data(const.CORONAKOMMISSIONV2)
-    insert_regions(database_con, json_regions)
+    # both files are fetched with conditional requests, unchanged files are
+    # neither parsed nor ingested. The warnings contain every snapshot, so
+    # they get parsed and ingested one snapshot at a time
+    json_regions = get_corona_data(database_con, const.CORONAKOMMISSIONV2,
+                                   cache_dir)
+    json_warnings = get_corona_snapshots(database_con,
+                                         const.WARNSTUFEN_AKTUELL, cache_dir)
+
+    if json_regions is not None:
+        insert_regions(database_con, json_regions)
+        mark_fetch_ingested(database_con, const.CORONAKOMMISSIONV2,
+                            cache_dir)
+    else:
+        # an unchanged feed does not fill a new full-text index
+        sync_region_search(database_con)
 
-    json_warnings = get_corona_data(const.WARNSTUFEN_AKTUELL)
-    inserted_warnings = insert_warnings(database_con, json_warnings)
+    if json_warnings is not None:
+        insert_warnings(database_con, json_warnings)
+        mark_fetch_ingested(database_con, const.WARNSTUFEN_AKTUELL,
+                            cache_dir)
 
     # close the database connection
     database_con.close()
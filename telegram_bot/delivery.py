@@ -0,0 +1,324 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Rate-limited, parallel delivery of messages to telegram-chats
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+
+import telegram.error
+
+import constants as const
+from constants import Logging as logg_const
+
+
+def is_permanent(error):
+    '''Checks if a delivery-error will also happen on every retry'''
+    return isinstance(error, (telegram.error.BadRequest,
+                              telegram.error.Unauthorized))
+
+
+def is_chat_gone(error):
+    '''Checks if a chat blocked the bot or does not exist anymore'''
+    if isinstance(error, telegram.error.Unauthorized):
+        return True
+
+    return (isinstance(error, telegram.error.BadRequest) and
+            "chat not found" in str(error).lower())
+
+
+class TokenBucket():
+    '''A thread-safe token-bucket, used to limit the global send-rate'''
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''Blocks until a token is available and takes it'''
+        while True:
+            with self.lock:
+                self.refill()
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Empties the bucket for the given time, used on flood-limits. Pauses
+        of several workers overlap, the bucket fills again once the longest
+        of them is over
+        """
+        with self.lock:
+            self.refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def refill(self):
+        '''Refills the bucket by the elapsed time, the lock has to be held'''
+        now = time.monotonic()
+
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class DeliveryQueue():
+    """
+    Sends messages with a pool of worker-threads. The global send-rate is
+    limited by a token-bucket and every chat gets at most one message per
+    chat_interval. Flood-limits and network-errors are retried with backoff
+    """
+
+    def __init__(self, bot, workers=const.DELIVERY_WORKERS,
+                 rate=const.DELIVERY_RATE, burst=const.DELIVERY_BURST,
+                 chat_interval=const.DELIVERY_CHAT_INTERVAL,
+                 max_retries=const.DELIVERY_MAX_RETRIES,
+                 backoff=const.DELIVERY_BACKOFF):
+        # any object with a send_message(chat_id, text)-method works as bot
+        self.bot = bot
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        # jobs are ordered by the time they may be send at, the counter
+        # keeps jobs with the same time in order
+        self.jobs = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.threads = []
+
+        # the time a message to a chat is planned at, used to order the
+        # queue, and the time the last message was actually send at
+        self.chat_slots = {}
+        self.chat_sent = {}
+
+        # chats that turned out to be gone in this batch, with the error.
+        # Their other queued messages are dropped instead of send
+        self.gone = {}
+
+        # counters, protected by the lock
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.pruned = 0
+        self.dropped = 0
+        self.outstanding = 0
+        self.batch_sent = 0
+        self.batch_started = None
+        self.batch_finished = None
+
+    def start(self):
+        '''Starts the worker-threads'''
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        '''Stops the worker-threads after the queued messages got send'''
+        for _ in self.threads:
+            self.jobs.put((float("inf"), next(self.counter), None))
+
+        for thread in self.threads:
+            thread.join()
+
+        self.threads = []
+
+    def submit(self, chat_id, text, callback=None):
+        """
+        Queues a message for a chat, the callback gets called with None once
+        the message got delivered or with the error if it failed
+        """
+        with self.lock:
+            # a new batch starts, used for the throughput. The slots of
+            # chats that may already be written to again are dropped
+            if self.outstanding == 0:
+                now = time.monotonic()
+                self.batch_sent = 0
+                self.batch_started = now
+                self.chat_slots = {chat: slot for chat, slot
+                                   in self.chat_slots.items() if slot > now}
+                self.chat_sent = {chat: sent for chat, sent
+                                  in self.chat_sent.items()
+                                  if sent + self.chat_interval > now}
+
+                # a chat may have come back since the last batch
+                self.gone = {}
+
+            self.outstanding += 1
+
+        self.schedule(chat_id, text, 0, 0, callback)
+
+    def schedule(self, chat_id, text, attempt, delay, callback):
+        '''Puts a job into the queue, respecting the rate-limit of the chat'''
+        with self.lock:
+            not_before = max(time.monotonic() + delay,
+                             self.chat_slots.get(chat_id, 0))
+            self.chat_slots[chat_id] = not_before + self.chat_interval
+
+        self.jobs.put((not_before, next(self.counter),
+                       (chat_id, text, attempt, callback)))
+
+    def join(self):
+        '''Blocks until all submitted messages are send or failed'''
+        self.jobs.join()
+
+    def work(self):
+        '''Main-loop of a worker-thread'''
+        while True:
+            not_before, _, job = self.jobs.get()
+
+            # stop-signal
+            if job is None:
+                self.jobs.task_done()
+                return
+
+            wait = not_before - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                self.deliver(*job)
+            finally:
+                self.jobs.task_done()
+
+    def deliver(self, chat_id, text, attempt, callback):
+        '''Sends a single message, rescheduling it on temporary errors'''
+        with self.lock:
+            error = self.gone.get(chat_id)
+
+        # the chat is gone, sending would only fail again
+        if error is not None:
+            with self.lock:
+                self.dropped += 1
+            self.fail(chat_id, error, callback)
+            return
+
+        self.bucket.acquire()
+
+        # waiting for the bucket may have moved the previous message to the
+        # chat closer, so the send-time is reserved right before sending
+        with self.lock:
+            now = time.monotonic()
+            send_at = max(now, self.chat_sent.get(chat_id, now -
+                                                  self.chat_interval) +
+                          self.chat_interval)
+            self.chat_sent[chat_id] = send_at
+
+        if send_at > now:
+            time.sleep(send_at - now)
+
+        try:
+            self.bot.send_message(chat_id=chat_id, text=text)
+
+        # telegram tells us how long to wait, the flood-limit applies to
+        # all chats, so every worker has to wait
+        except telegram.error.RetryAfter as error:
+            self.bucket.pause(error.retry_after)
+            self.retry(chat_id, text, attempt, error, error.retry_after,
+                       callback)
+
+        # bad requests and blocked chats will not work on a retry either
+        except (telegram.error.BadRequest,
+                telegram.error.Unauthorized) as error:
+            self.fail(chat_id, error, callback)
+
+        except telegram.error.NetworkError as error:
+            self.retry(chat_id, text, attempt, error,
+                       self.backoff * 2 ** attempt, callback)
+
+        except Exception as error:
+            self.fail(chat_id, error, callback)
+
+        else:
+            with self.lock:
+                self.sent += 1
+                self.batch_sent += 1
+                self.finish()
+
+            self.notify(callback, None)
+
+    def notify(self, callback, error):
+        '''Calls the callback of a message, errors in it are only logged'''
+        if callback is None:
+            return
+
+        try:
+            callback(error)
+        except Exception as exception:
+            logging.exception(exception)
+
+    def retry(self, chat_id, text, attempt, error, delay, callback):
+        '''Reschedules a message or gives up after max_retries'''
+        if attempt >= self.max_retries:
+            self.fail(chat_id, error, callback)
+            return
+
+        logging.warning(logg_const.DELIVERY_RETRY.format(chat_id=chat_id,
+                                                         error=error,
+                                                         delay=delay))
+        with self.lock:
+            self.retried += 1
+
+        self.schedule(chat_id, text, attempt + 1, delay, callback)
+
+    def fail(self, chat_id, error, callback):
+        '''Counts and logs a message that could not be delivered'''
+        logging.error(logg_const.DELIVERY_FAILED.format(chat_id=chat_id,
+                                                        error=error))
+        with self.lock:
+            self.failed += 1
+            if is_chat_gone(error):
+                self.gone.setdefault(chat_id, error)
+            self.finish()
+
+        self.notify(callback, error)
+
+    def chat_pruned(self, chat_id):
+        '''Counts a chat that got marked as inactive in the database'''
+        with self.lock:
+            self.pruned += 1
+
+    def finish(self):
+        '''Counts a finished message, the lock has to be held'''
+        self.outstanding -= 1
+
+        if self.outstanding == 0:
+            self.batch_finished = time.monotonic()
+
+    def stats(self):
+        '''Returns the counters of the queue'''
+        with self.lock:
+            # throughput of the current or of the last batch
+            if self.batch_started is None:
+                throughput = 0.0
+            else:
+                if self.outstanding == 0:
+                    elapsed = self.batch_finished - self.batch_started
+                else:
+                    elapsed = time.monotonic() - self.batch_started
+                throughput = self.batch_sent / max(elapsed, 1e-9)
+
+            return {"sent": self.sent,
+                    "failed": self.failed,
+                    "retried": self.retried,
+                    "pruned": self.pruned,
+                    "dropped": self.dropped,
+                    "queued": self.jobs.qsize(),
+                    "outstanding": self.outstanding,
+                    "throughput": throughput}
@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Standalone delivery-worker for the alert-messages of the coronaampel-bot.
+Any number of workers can run against the same database, they claim the
+messages of the outbox with leases and can split the chats into shards
+"""
+
+import argparse
+from datetime import datetime
+import json
+import logging
+import signal
+import threading
+
+import telegram
+from telegram.utils.request import Request
+
+import constants as const
+from constants import Logging as logg_const
+import delivery
+import migrations
+import outbox
+import utils
+
+
+def parse_shard(value):
+    '''Parses a shard in the form "index/count", e.g. "0/4"'''
+    try:
+        shard, shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            logg_const.INVALID_SHARD.format(shard=value))
+
+    if shards < 1 or not 0 <= shard < shards:
+        raise argparse.ArgumentTypeError(
+            logg_const.INVALID_SHARD.format(shard=value))
+
+    return shard, shards
+
+
+class DeliveryWorker():
+    """
+    Delivers the messages of the outbox until it gets stopped. Messages that
+    are claimed but not yet send get released on a stop, so no work is lost
+    """
+
+    def __init__(self, bot, sql_path, shard=0, shards=1,
+                 batch_size=const.OUTBOX_BATCH_SIZE,
+                 poll_interval=const.DELIVERY_POLL_INTERVAL,
+                 **queue_options):
+        self.shard = shard
+        self.shards = shards
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        # the owner-name is unique per process, so a restarted worker never
+        # mistakes the leases of its predecessor for its own
+        self.owner = outbox.get_owner_name(
+            "worker-{shard}-{shards}".format(shard=shard, shards=shards))
+
+        self.database = utils.ConnectionManager(sql_path)
+        self.delivery = delivery.DeliveryQueue(bot, **queue_options)
+        self.stop_event = threading.Event()
+
+    def check_schema(self):
+        '''Makes sure, that the bot already created the outbox'''
+
+        # the migrations are only run by the bot, several workers starting
+        # at once must not migrate the same database
+        with self.database.writer() as connection:
+            version = migrations.get_schema_version(connection)
+
+        if version < migrations.MIGRATIONS[-1][0]:
+            raise RuntimeError(logg_const.SCHEMA_OUTDATED.format(
+                version=version))
+
+    def run(self):
+        '''Delivers messages until the worker gets stopped'''
+        self.check_schema()
+        self.delivery.start()
+
+        logging.info(logg_const.WORKER_STARTED.format(owner=self.owner,
+                                                      shard=self.shard,
+                                                      shards=self.shards))
+
+        try:
+            while not self.stop_event.is_set():
+                claimed = outbox.deliver_pending(self.database,
+                                                 self.delivery, self.owner,
+                                                 self.batch_size,
+                                                 self.shard, self.shards,
+                                                 self.stop_event)
+
+                if claimed > 0:
+                    logging.info(logg_const.DELIVERY_STATS.format(
+                        **self.delivery.stats()))
+
+                # the outbox is empty, wait for new messages. A stop wakes
+                # the worker up right away
+                self.stop_event.wait(self.poll_interval)
+
+        finally:
+            logging.info(logg_const.WORKER_STOPPING.format(owner=self.owner))
+
+            # the queued messages are still send, everything else is given
+            # back to the outbox for the other workers
+            self.delivery.stop()
+            with self.database.writer() as connection:
+                outbox.release_leases(connection, self.owner)
+            self.database.close()
+
+            logging.info(logg_const.WORKER_STOPPED.format(owner=self.owner))
+
+    def stop(self, *_):
+        '''Stops the worker after the current batch, also a signal-handler'''
+        self.stop_event.set()
+
+
+def main():
+    '''The main programmfunction, gets called whenever the modul is run'''
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1),
+                        help="only deliver to the chats of this shard, "
+                             "given as index/count, e.g. 0/4")
+    parser.add_argument("--workers", type=int,
+                        default=const.DELIVERY_WORKERS,
+                        help="number of sending threads")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="messages per second of this worker, defaults "
+                             "to the share of the shard in the rate of the "
+                             "bot")
+    parser.add_argument("--batch-size", type=int,
+                        default=const.OUTBOX_BATCH_SIZE,
+                        help="messages claimed at once")
+    parser.add_argument("--poll-interval", type=float,
+                        default=const.DELIVERY_POLL_INTERVAL,
+                        help="seconds to wait if the outbox is empty")
+    parser.add_argument("--base-url", default=None,
+                        help="url of the bot-api, e.g. of a local fake-api")
+    parser.add_argument("--config", default=const.CONFIG_FILE,
+                        help="path to the config-file")
+    arguments = parser.parse_args()
+
+    shard, shards = arguments.shard
+
+    # telegram limits the messages of a bot over all chats, all workers
+    # share that budget. More workers can not send faster than that, they
+    # only split the work
+    share = const.DELIVERY_RATE / shards
+    if arguments.rate is None:
+        arguments.rate = share
+    elif arguments.rate > share:
+        parser.error(logg_const.RATE_OVER_BUDGET.format(
+            rate=arguments.rate, shards=shards,
+            budget=const.DELIVERY_RATE, share=share))
+
+    log_filename = const.DELIVERY_WORKER_LOG.format(
+        shard=shard, date=datetime.date(datetime.now()))
+
+    logging.basicConfig(format='%(asctime)s:%(levelname)s - %(message)s',
+                        level=logging.INFO,
+                        handlers=[logging.FileHandler(log_filename),
+                                  logging.StreamHandler()])
+
+    with open(arguments.config, "r") as file:
+        configurations = json.loads(file.read())
+
+    # every sending thread needs its own connection to the bot-api
+    bot = telegram.Bot(token=configurations["telegram-token"],
+                       base_url=arguments.base_url,
+                       request=Request(con_pool_size=arguments.workers +
+                                       const.BOT_POOL_HEADROOM))
+
+    worker = DeliveryWorker(bot, configurations["database_path"],
+                            shard, shards, arguments.batch_size,
+                            arguments.poll_interval,
+                            workers=arguments.workers,
+                            rate=arguments.rate,
+                            burst=max(1, int(arguments.rate)))
+
+    # stop gracefully on ctrl+c and when the service gets stopped
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
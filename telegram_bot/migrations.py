@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Versioned schema-migrations for the sqlite-database of the coronaampel-bot
+"""
+
+import logging
+import re
+
+from constants import Database as db_const
+from constants import Logging as logg_const
+from utils import transaction
+
+
+# Every migration consists of a version, a name and a list of statements.
+# The version of the database is stored in the user_version pragma, so every
+# migration with a higher version gets applied in order. Migration 1 is the
+# initial schema, all statements in it are idempotent so that databases
+# created before the migrations existed can be upgraded in place
+MIGRATIONS = [
+    (1, "initial schema", [
+        db_const.CREATE_REGIONS_TABLE,
+        db_const.CREATE_WARNINGS_TABLE,
+        db_const.CREATE_USERS_TABLE,
+        db_const.CREATE_SUBSCRIPTIONS_TABLE,
+        db_const.CREATE_UPDATES_TABLE,
+        db_const.CREATE_TABLE_UPDATE_TIMES,
+        db_const.CREATE_SYNC_STATE_TABLE,
+    ]),
+    (2, "indexes, unique constraints and integer region-ids", [
+        db_const.CREATE_WARNINGS_TABLE_V2,
+        db_const.COPY_WARNINGS_TABLE_V2,
+        db_const.DROP_WARNINGS_TABLE,
+        db_const.RENAME_WARNINGS_TABLE_V2,
+        db_const.DEDUPLICATE_SUBSCRIPTIONS,
+        db_const.CREATE_SUBSCRIPTIONS_USER_INDEX,
+        db_const.CREATE_SUBSCRIPTIONS_REGION_INDEX,
+        db_const.CREATE_UPDATES_PENDING_INDEX,
+        db_const.CREATE_UPDATES_REGION_INDEX,
+        db_const.DEDUPLICATE_UPDATE_TIMES,
+        db_const.CREATE_UPDATE_TIMES_INDEX,
+    ]),
+    (3, "outbox for the alert-messages", [
+        db_const.CREATE_OUTBOX_TABLE,
+        db_const.CREATE_OUTBOX_PENDING_INDEX,
+        db_const.CREATE_OUTBOX_LEASE_INDEX,
+        db_const.CREATE_OUTBOX_CREATED_INDEX,
+    ]),
+    (4, "inactive chats", [
+        db_const.ADD_USERS_ACTIVE_COLUMN,
+    ]),
+    (5, "snapshots of the dashboard", [
+        db_const.CREATE_DASHBOARD_SNAPSHOTS_TABLE,
+        db_const.CREATE_DASHBOARD_SNAPSHOTS_INDEX,
+    ]),
+    (6, "full-text search over the regions", [
+        db_const.CREATE_REGIONS_FTS_TABLE,
+        db_const.RESET_REGIONS_SYNC_HASH,
+    ]),
+    (7, "validators of the conditional requests", [
+        db_const.ADD_SYNC_STATE_ETAG_COLUMN,
+        db_const.ADD_SYNC_STATE_LAST_MODIFIED_COLUMN,
+    ]),
+    (8, "delivery-attempts of the outbox", [
+        db_const.ADD_OUTBOX_ATTEMPTS_COLUMN,
+    ]),
+]
+
+# The queries that run on every command or for every region, together with
+# some sample-values for the parameters. None of them may scan a table
+HOT_QUERIES = [
+    (db_const.CHECK_WARNING, {"region_id": 10101}),
+    (db_const.LOOKUP_USER, {"user_id": 1}),
+    (db_const.LOOKUP_USER_ACTIVE, {"user_id": 1}),
+    (db_const.DEACTIVATE_USER, {"user_id": 1}),
+    (db_const.ACTIVATE_USER, {"user_id": 1}),
+    (db_const.SUB_USER_REGION_LOOKUP, {"user_id": 1, "region_id": 10101}),
+    (db_const.UBSUB_USER_REGION, {"user_id": 1, "region_id": 10101}),
+    (db_const.UBSUB_USER_ALL_REGION, {"user_id": 1}),
+    (db_const.GET_LAST_PENDING_UPDATE, {}),
+    (db_const.GET_PENDING_LEVEL_CHANGES, {"last_update": 1}),
+    (db_const.MARK_UPDATES_AS_READ, {"last_update": 1}),
+    (db_const.GET_SYNC_HASH, {"name": "regions"}),
+    (db_const.SEARCH_REGIONS, {"query": '"wien"*', "type": "Gemeinde",
+                               "limit": 20}),
+    (db_const.CLAIM_OUTBOX, {"owner": "bot", "expires": 1.0, "now": 0.0,
+                             "shards": 1, "shard": 0, "limit": 500}),
+    (db_const.FAIL_EXHAUSTED_OUTBOX, {"max_attempts": 5, "now": 0.0}),
+    (db_const.RELEASE_OUTBOX, {"owner": "bot"}),
+    (db_const.GET_CLAIMED_OUTBOX, {"owner": "bot", "expires": 1.0}),
+    (db_const.MARK_OUTBOX_DELIVERED, {"id": 1}),
+    (db_const.FAIL_OUTBOX_CHAT, {"chat_id": 1}),
+    (db_const.GET_DASHBOARD_SNAPSHOT, {"url": "Bundesland.js",
+                                       "before": 0.0}),
+]
+
+# A table scan shows up as "SCAN <table>" in the query plan, before sqlite
+# 3.36 as "SCAN TABLE <table>". Scans over an index or over the result of a
+# subquery are fine
+TABLE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def get_schema_version(connection):
+    '''Returns the schema-version stored in the database'''
+    return connection.execute(db_const.GET_SCHEMA_VERSION).fetchone()[0]
+
+
+def migrate(connection):
+    """
+    Applies all missing migrations to the database, every migration runs in
+    its own transaction. Returns the schema-version of the database
+    """
+    version = get_schema_version(connection)
+
+    for migration_version, name, statements in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        # the statements and the new version get commited together, a failed
+        # migration leaves the database at the previous version
+        with transaction(connection):
+            # the bot and the ingest may start at the same time, the version
+            # is read again under the write-lock so only one of them applies
+            # the migration
+            version = get_schema_version(connection)
+            if migration_version <= version:
+                continue
+
+            logging.info(logg_const.MIGRATING.format(
+                version=migration_version, name=name))
+
+            for statement in statements:
+                connection.execute(statement)
+
+            connection.execute(db_const.SET_SCHEMA_VERSION.format(
+                version=migration_version))
+
+        version = migration_version
+
+    logging.info(logg_const.MIGRATED.format(version=version))
+
+    return version
+
+
+def find_table_scans(connection):
+    """
+    Returns a list of (query, detail)-tuples for every hot query that falls
+    back to a table scan
+    """
+    table_scans = []
+
+    tables = {row[0] for row in connection.execute(db_const.GET_TABLE_NAMES)}
+
+    for query, params in HOT_QUERIES:
+        plan_query = db_const.EXPLAIN_QUERY_PLAN.format(query=query)
+
+        # result: (id, parent, notused, detail)
+        for row in connection.execute(plan_query, params):
+            table_scan = TABLE_SCAN.match(row[3])
+            if table_scan is not None and table_scan.group(1) in tables:
+                table_scans.append((query, row[3]))
+
+    return table_scans
+
+
+def check_query_plans(connection):
+    """
+    Logs every hot query that falls back to a table scan and returns them.
+    A slow query must not stop the ingest, the tests fail on it instead
+    """
+    table_scans = find_table_scans(connection)
+
+    for query, detail in table_scans:
+        logging.error(logg_const.TABLE_SCAN.format(query=query,
+                                                   detail=detail))
+
+    return table_scans
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Planning of the alert-notifications that get send to the subscribers of a
+region after its alert-level changed
+"""
+
+import constants as const
+from constants import Database as db_const
+from constants import TelegramConstants as tele_const
+from utils import execute, fetch_all, fetch_one
+
+
+def render_alert(region_name, old_level, new_level):
+    '''Returns the alert-text for a region that changed its alert-level'''
+
+    # the newer level is higher than the older one, the level has risen
+    if new_level > old_level:
+        response = tele_const.REGION_HIGHER_ALERT
+    else:
+        response = tele_const.REGION_LOWER_ALERT
+
+    response += tele_const.REGION_ALERT_BODY.format(
+        city_name=region_name,
+        level1=const.ALERT_COLORS[old_level],
+        level2=const.ALERT_COLORS[new_level],
+        url_link=const.ALERT_URL[new_level])
+
+    return response
+
+
+def plan_notifications(connection, subscriptions):
+    """
+    Collects all pending level-changes with a single query, the subscribers
+    of the regions come from the subscription-index. Returns the id of the
+    last update that got planned and a list of
+    (user_id, region_name, text)-tuples
+    """
+    last_update = fetch_one(connection, db_const.GET_LAST_PENDING_UPDATE)[0]
+
+    # there are no pending updates
+    if last_update is None:
+        return None, []
+
+    result = fetch_all(connection, db_const.GET_PENDING_LEVEL_CHANGES,
+                       {"last_update": last_update})
+
+    notifications = []
+
+    # result: (region_id, region_name, old_level, new_level). Regions
+    # without any active subscribers are skipped, all subscribers of a
+    # region share its rendered alert-text
+    for region_id, region_name, old_level, new_level in result:
+        users = subscriptions.subscribers(region_id)
+
+        if len(users) == 0:
+            continue
+
+        text = render_alert(region_name, old_level, new_level)
+
+        notifications.extend((user_id, region_name, text)
+                             for user_id in sorted(users))
+
+    return last_update, notifications
+
+
+def split_message(parts, limit=const.MAX_MESSAGE_LENGTH):
+    """
+    Joins the parts into as few messages as possible, no message is longer
+    than the limit. Parts are only split if they are too long on their own
+    """
+    separator = tele_const.DIGEST_SEPARATOR
+    messages = []
+    current = ""
+
+    for part in parts:
+        # a single part that does not fit into a message gets cut
+        while len(part) > limit:
+            if current:
+                messages.append(current)
+                current = ""
+            messages.append(part[:limit])
+            part = part[limit:]
+
+        if not current:
+            current = part
+        elif len(current) + len(separator) + len(part) <= limit:
+            current += separator + part
+        else:
+            messages.append(current)
+            current = part
+
+    if current:
+        messages.append(current)
+
+    return messages
+
+
+def build_digests(notifications):
+    """
+    Groups the planned notifications by chat, every user gets one digest
+    with all of their changed regions. Returns a list of
+    (user_id, region_names, messages)-tuples
+    """
+    digests = {}
+
+    # the notifications are ordered by region, dicts keep the order of the
+    # users as they showed up first
+    for user_id, region_name, text in notifications:
+        if user_id not in digests:
+            digests[user_id] = ([], [])
+
+        digests[user_id][0].append(region_name)
+        digests[user_id][1].append(text)
+
+    return [(user_id, region_names, split_message(texts))
+            for user_id, (region_names, texts) in digests.items()]
+
+
+def mark_updates_as_read(connection, last_update):
+    '''Marks all updates up to the last planned one as read'''
+    if last_update is None:
+        return 0
+
+    return execute(connection, db_const.MARK_UPDATES_AS_READ,
+                   {"last_update": last_update})
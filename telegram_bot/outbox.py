@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+A durable outbox for the alert-messages. The fan-out writes every message
+into the outbox in the same transaction that marks the updates as read,
+delivery-workers claim the messages in batches and mark them one by one
+"""
+
+import functools
+import logging
+import os
+import socket
+import time
+import uuid
+
+import constants as const
+from constants import Database as db_const
+from constants import Logging as logg_const
+import delivery
+from utils import execute, fetch_all
+
+
+def get_owner_name(prefix):
+    '''Returns a unique name for the leases of a process'''
+    return "{prefix}@{host}:{pid}:{uid}".format(prefix=prefix,
+                                                host=socket.gethostname(),
+                                                pid=os.getpid(),
+                                                uid=uuid.uuid4().hex[:8])
+
+
+def enqueue_digests(connection, digests):
+    """
+    Writes the messages of the digests into the outbox, this has to run in
+    the transaction that marks the updates as read
+    """
+    created = time.time()
+
+    rows = [{"chat_id": user_id, "message": message, "created": created}
+            for user_id, _, messages in digests
+            for message in messages]
+
+    connection.executemany(db_const.INSERT_OUTBOX, rows)
+
+    # delivered messages are only kept for a while
+    execute(connection, db_const.DELETE_OLD_OUTBOX,
+            {"before": created - const.OUTBOX_RETENTION})
+
+    logging.info(logg_const.OUTBOX_ENQUEUED.format(count=len(rows)))
+
+    return len(rows)
+
+
+def claim_batch(connection, owner, limit=const.OUTBOX_BATCH_SIZE,
+                lease=const.OUTBOX_LEASE, shard=0, shards=1,
+                max_attempts=const.OUTBOX_MAX_ATTEMPTS):
+    """
+    Claims the next batch of pending messages of the shard for the owner,
+    returns a list of (id, chat_id, message)-tuples. Messages that were
+    claimed max_attempts times already are marked as failed instead
+    """
+    now = time.time()
+    expires = now + lease
+
+    # errors that are neither permanent nor retried leave a message
+    # pending, without a limit it would be claimed again forever
+    exhausted = execute(connection, db_const.FAIL_EXHAUSTED_OUTBOX,
+                        {"max_attempts": max_attempts, "now": now})
+
+    if exhausted > 0:
+        logging.warning(logg_const.OUTBOX_EXHAUSTED.format(
+            count=exhausted, attempts=max_attempts))
+
+    execute(connection, db_const.CLAIM_OUTBOX,
+            {"owner": owner, "expires": expires, "now": now,
+             "shards": shards, "shard": shard, "limit": limit})
+
+    rows = fetch_all(connection, db_const.GET_CLAIMED_OUTBOX,
+                     {"owner": owner, "expires": expires})
+
+    if len(rows) > 0:
+        logging.info(logg_const.OUTBOX_CLAIMED.format(owner=owner,
+                                                      count=len(rows)))
+
+    return rows
+
+
+def release_leases(connection, owner):
+    '''Gives all pending messages claimed by the owner back to the outbox'''
+    count = execute(connection, db_const.RELEASE_OUTBOX, {"owner": owner})
+
+    if count > 0:
+        logging.info(logg_const.OUTBOX_RELEASED.format(owner=owner,
+                                                       count=count))
+
+    return count
+
+
+def mark_message(database, message_id, chat_id, error, on_pruned=None):
+    """
+    Marks a message as delivered or as failed if it can never be delivered.
+    Other failed messages stay pending and get claimed again once the lease
+    expired, up to OUTBOX_MAX_ATTEMPTS times. Chats that are gone are
+    marked as inactive, on_pruned gets called with the chat inside the
+    same transaction if it was active
+    """
+    if error is None:
+        query = db_const.MARK_OUTBOX_DELIVERED
+    elif delivery.is_permanent(error):
+        query = db_const.MARK_OUTBOX_FAILED
+    else:
+        return
+
+    with database.writer() as connection:
+        execute(connection, query, {"id": message_id})
+
+        if error is not None and delivery.is_chat_gone(error):
+            if prune_chat(connection, chat_id, error) and \
+                    on_pruned is not None:
+                on_pruned(chat_id)
+
+
+def prune_chat(connection, chat_id, error):
+    """
+    Marks a chat as inactive and drops its pending messages, returns False
+    if the chat was already inactive
+    """
+    execute(connection, db_const.FAIL_OUTBOX_CHAT, {"chat_id": chat_id})
+
+    # every failed message of the chat ends up here, the chat only counts
+    # as pruned once
+    if execute(connection, db_const.DEACTIVATE_USER,
+               {"user_id": chat_id}) == 0:
+        return False
+
+    logging.warning(logg_const.CHAT_PRUNED.format(chat_id=chat_id,
+                                                  error=error))
+
+    return True
+
+
+def deliver_pending(database, delivery_queue, owner,
+                    limit=const.OUTBOX_BATCH_SIZE, shard=0, shards=1,
+                    stop_event=None, on_pruned=None):
+    """
+    Delivers all pending messages of the shard over the delivery-queue,
+    batch by batch, until the outbox is empty or the stop_event is set.
+    Returns the number of claimed messages. on_pruned gets called with
+    every chat that got marked as inactive, by default it is counted by
+    the delivery-queue
+    """
+    if on_pruned is None:
+        on_pruned = delivery_queue.chat_pruned
+
+    claimed = 0
+
+    while stop_event is None or not stop_event.is_set():
+        with database.writer() as connection:
+            rows = claim_batch(connection, owner, limit, shard=shard,
+                               shards=shards)
+
+        if len(rows) == 0:
+            return claimed
+
+        claimed += len(rows)
+
+        # every message gets marked on its own as soon as it got send, so a
+        # restart only resends the messages that were in flight
+        for message_id, chat_id, message in rows:
+            delivery_queue.submit(chat_id, message,
+                                  functools.partial(mark_message, database,
+                                                    message_id, chat_id,
+                                                    on_pruned=on_pruned))
+
+        delivery_queue.join()
+
+    return claimed
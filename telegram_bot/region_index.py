@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Search over the names of the municipalities, used by /subscribe. Either
+with an in-memory index or with the full-text index of the database
+"""
+
+import logging
+import re
+import threading
+import unicodedata
+
+import constants as const
+from constants import Database as db_const
+from constants import Logging as logg_const
+from utils import fetch_all, fetch_one
+
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue"})
+NON_WORD = re.compile(r"[\W_]+")
+
+# ranks of the matches, lower is better
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+
+def normalize(text):
+    '''Lowercases the text and turns everything but letters into spaces'''
+    return NON_WORD.sub(" ", text.casefold()).strip()
+
+
+def fold(text):
+    """
+    Returns the two searchable forms of a text, one with the umlauts
+    written out ("Pölten" -> "poelten") and one without the dots
+    ("Pölten" -> "polten"), so both ways of typing an umlaut match
+    """
+    text = normalize(text)
+    expanded = text.translate(UMLAUTS)
+    plain = "".join(char for char in unicodedata.normalize("NFKD", text)
+                    if not unicodedata.combining(char))
+
+    return expanded, plain
+
+
+def fts_document(name):
+    '''Returns the searchable text of a name for the full-text index'''
+    expanded, plain = fold(name)
+
+    if expanded == plain:
+        return expanded
+
+    return expanded + " " + plain
+
+
+def fts_query(text):
+    """
+    Returns a fts5-query that matches every name containing words that
+    start with the words of the text, None if the text has no words
+    """
+    words = fold(text)[0].split()
+
+    if len(words) == 0:
+        return None
+
+    # the words only consist of letters and digits, so quoting is safe
+    return " ".join('"{word}"*'.format(word=word) for word in words)
+
+
+def fill_region_search(connection):
+    """
+    Rebuilds the full-text index from the regions-table, this has to run
+    in the transaction that changes the regions
+    """
+    rows = [(region_id, name, region_type, district, fts_document(name))
+            for region_id, name, region_type, district
+            in fetch_all(connection, db_const.GET_REGIONS_WITH_DISTRICT)]
+
+    connection.execute(db_const.CLEAR_REGION_SEARCH)
+    connection.executemany(db_const.BULK_INSERT_REGION_SEARCH, rows)
+
+    logging.info(logg_const.REGION_SEARCH_BUILT.format(count=len(rows)))
+
+    return len(rows)
+
+
+def trigrams(text):
+    '''Returns all substrings of length 3 of the text'''
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def rank(query, name):
+    '''Returns how well the query matches the name, None if it does not'''
+    if query == name:
+        return RANK_EXACT
+    if name.startswith(query):
+        return RANK_PREFIX
+    if (" " + query) in name:
+        return RANK_WORD_PREFIX
+    if query in name:
+        return RANK_SUBSTRING
+
+    return None
+
+
+class RegionIndex():
+    """
+    A trigram-index over the folded names of the municipalities. A query
+    only gets compared with the names that contain all of its trigrams
+    """
+
+    def __init__(self):
+        # regions: list of (name, id, type, district, expanded, plain),
+        # trigrams: trigram
+        # -> set of positions in regions. Both get replaced together, so
+        # searches never see a half built index
+        self.index = ([], {})
+        self.sync_hash = None
+        self.lock = threading.Lock()
+
+        # results of the last searches by their folded query, most users
+        # look for the same few places. Dropped on every rebuild
+        self.results = {}
+
+    def build(self, rows):
+        '''Builds the index from (id, name, type, district)-rows'''
+        regions = []
+        index = {}
+
+        for position, (region_id, name, region_type, district) \
+                in enumerate(rows):
+            expanded, plain = fold(name)
+            regions.append((name, region_id, region_type, district,
+                            expanded, plain))
+
+            for trigram in trigrams(expanded) | trigrams(plain):
+                index.setdefault(trigram, set()).add(position)
+
+        self.index = (regions, index)
+        self.results = {}
+
+        return len(regions)
+
+    def refresh(self, connection):
+        """
+        Rebuilds the index if the regions changed since the last build,
+        the hash of the last region-sync tells if they did
+        """
+        result = fetch_one(connection, db_const.GET_SYNC_HASH,
+                           {"name": const.REGIONS_SYNC_NAME})
+        sync_hash = None if result is None else result[0]
+
+        with self.lock:
+            if sync_hash == self.sync_hash and self.index[0]:
+                return False
+
+            count = self.build(fetch_all(connection,
+                                         db_const.GET_MUNICIPALITIES))
+            self.sync_hash = sync_hash
+
+        logging.info(logg_const.REGION_INDEX_BUILT.format(count=count,
+                                                          hash=sync_hash))
+
+        return True
+
+    def candidates(self, regions, index, queries):
+        '''Returns the positions of all names that may match the queries'''
+        result = set()
+
+        for query in queries:
+            query_trigrams = trigrams(query)
+
+            # queries shorter than a trigram have to check every name
+            if len(query_trigrams) == 0:
+                return range(len(regions))
+
+            # intersecting the smallest sets first keeps this fast
+            sets = sorted((index.get(trigram, set())
+                           for trigram in query_trigrams), key=len)
+            result |= set.intersection(*sets)
+
+        return result
+
+    def search(self, text):
+        """
+        Returns the (name, id, type, district)-tuples of the municipalities
+        matching the text, the best matches first. Umlauts and case do not
+        matter
+        """
+        regions, index = self.index
+        results = self.results
+        key = fold(text)
+
+        if key in results:
+            return results[key]
+
+        expanded, plain = key
+        matches = []
+
+        if expanded:
+            for position in self.candidates(regions, index, set(key)):
+                name_expanded, name_plain = regions[position][4:]
+                best = rank(expanded, name_expanded)
+
+                # the plain form only matters if one of the two has umlauts
+                if best != RANK_EXACT and (plain != expanded or
+                                           name_plain != name_expanded):
+                    other = rank(plain, name_plain)
+                    if best is None or (other is not None and other < best):
+                        best = other
+
+                if best is not None:
+                    name = regions[position][0]
+                    matches.append((best, len(name), name, position))
+
+            matches.sort()
+
+        result = [regions[position][:4] for _, _, _, position
+                  in matches[:const.REGION_SEARCH_LIMIT]]
+
+        # the oldest result is dropped once the cache is full
+        if len(results) >= const.REGION_SEARCH_CACHE_SIZE:
+            results.pop(next(iter(results)), None)
+        results[key] = result
+
+        return result
+
+
+class RegionNames():
+    """
+    The names of all regions by their GKZ, so the buttons only have to
+    carry the GKZ. Reloaded whenever the regions change
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.sync_hash = None
+        self.lock = threading.Lock()
+
+    def refresh(self, connection):
+        '''Reloads the names if the regions changed since the last load'''
+        result = fetch_one(connection, db_const.GET_SYNC_HASH,
+                           {"name": const.REGIONS_SYNC_NAME})
+        sync_hash = None if result is None else result[0]
+
+        with self.lock:
+            if sync_hash == self.sync_hash and self.names:
+                return False
+
+            # the dict is replaced at once, lookups never see a half one
+            self.names = dict(fetch_all(connection,
+                                        db_const.GET_REGION_NAMES))
+            self.sync_hash = sync_hash
+
+        logging.info(logg_const.REGION_NAMES_LOADED.format(
+            count=len(self.names), hash=sync_hash))
+
+        return True
+
+    def name(self, region_id):
+        '''Returns the name of the region, None if it is unknown'''
+        return self.names.get(region_id)
+
+
+class FtsRegionSearch():
+    """
+    Searches the municipalities with the full-text index of the database,
+    for deployments that do not want to keep the index in memory. The
+    words of the text are matched as prefixes and ranked by bm25
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def refresh(self, connection):
+        '''The full-text index is kept in sync by the ingest'''
+        return False
+
+    def search(self, text):
+        '''Returns the (name, id, type, district)-tuples of the matches'''
+        query = fts_query(text)
+
+        if query is None:
+            return []
+
+        return fetch_all(self.database.reader(), db_const.SEARCH_REGIONS,
+                         {"query": query, "type": "Gemeinde",
+                          "limit": const.REGION_SEARCH_LIMIT})
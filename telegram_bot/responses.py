@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Pre-rendered responses of the statistics-commands. A response only changes
+when the dashboard publishes a new version of its data, so every response
+is rendered once per data-version and then shared by all requests. The
+versions come from the dashboard-cache, so a request never touches the
+database
+"""
+
+import threading
+
+import constants as const
+from constants import TelegramConstants as tele_const
+import snapshots
+from utils import get_data_js_files, string_assembler
+
+
+def parse_number(value):
+    '''Converts a number of the dashboard like "1.234" into an int'''
+    return int(value.replace(".", ""))
+
+
+class RenderCache():
+    '''Keeps the last rendered response of every command and its versions'''
+
+    def __init__(self):
+        # name -> (versions, response)
+        self.responses = {}
+        self.lock = threading.Lock()
+        self.renders = 0
+
+    def get(self, name, versions, render):
+        """
+        Returns the response of render(), it is only called if the versions
+        of the files the response comes from changed since the last time
+        """
+        # rendering takes less than a millisecond, so it happens under the
+        # lock and every version is rendered exactly once
+        with self.lock:
+            entry = self.responses.get(name)
+
+            if entry is None or entry[0] != versions:
+                entry = (versions, render())
+                self.responses[name] = entry
+                self.renders += 1
+
+            return entry[1]
+
+
+render_cache = RenderCache()
+
+
+class Yesterday():
+    """
+    The data of the /caseinfo-files as it was a day ago and its version.
+    It is loaded from the snapshots outside of the requests, by refresh
+    """
+
+    def __init__(self, urls):
+        self.urls = urls
+
+        # (data, version), replaced as a whole so readers need no lock
+        self.snapshot = ({}, None)
+
+    def refresh(self, connection):
+        '''Loads the newest snapshots that are at least a day old'''
+        data = snapshots.load_yesterday(connection, self.urls) or {}
+        self.snapshot = (data, snapshots.get_version(data))
+
+
+yesterday = Yesterday(const.EPIDEMIC_OVERVIEW_URLS)
+
+
+def render_change(data, yesterday):
+    '''Renders the change of the epidemic-overview since yesterday'''
+    def change(name):
+        return parse_number(data[name]) - parse_number(yesterday[name])
+
+    return tele_const.EPIDEMIC_CHANGE.format(
+        tests=change("dpGesTestungen"),
+        pos_tests=change("dpPositivGetestet"),
+        pos_tests_curr=change("dpAktuelleErkrankungen"),
+        int_care=change("dpGesIBBel"),
+        care=change("dpGesNBBel"))
+
+
+def render_caseinfo(data, yesterday):
+    """
+    Renders the epidemic-overview of /caseinfo, the change since yesterday
+    is only shown if there is a snapshot of yesterday
+    """
+    pos_tests_total = parse_number(data["dpPositivGetestet"])
+    confirmed_cases_quarantine = parse_number(data["dpBFNH"])
+    pos_tests_crr = parse_number(data["dpAktuelleErkrankungen"])
+    avail_int_care = parse_number(data["dpGesIBVerf"])
+    int_care_curr_use = parse_number(data["dpGesIBBel"])
+    avail_care = parse_number(data["dpGesNBVerf"])
+    care_curr_use = parse_number(data["dpGesNBBel"])
+
+    response = tele_const.EPIDEMIC_OVERVIEW.format(
+        tests_total=data["dpGesTestungen"],
+        pos_tests_total=pos_tests_total,
+        pos_tests_curr=pos_tests_crr,
+        tests_perc=(100 / (pos_tests_total / pos_tests_crr)),
+        hospital=pos_tests_crr - confirmed_cases_quarantine,
+        avail_int_care=avail_int_care,
+        int_care_curr_use=int_care_curr_use,
+        int_care_percent=(100 / (avail_int_care / int_care_curr_use)),
+        avail_care=avail_care,
+        care_percent=(100 / (avail_care / care_curr_use)),
+        care_curr_use=care_curr_use,
+        female=data["dpGeschlechtsverteilung"][0]["y"],
+        male=data["dpGeschlechtsverteilung"][1]["y"],
+        update_time=data["GesamtzahlTestungenVersion"].split("V")[0])
+
+    if yesterday:
+        response += render_change(data, yesterday)
+
+    return response
+
+
+def render_age_distribution(data):
+    '''Renders the age-distribution of /agedistribution'''
+    return string_assembler(data["dpAltersverteilung"],
+                            data["AltersverteilungVersion"],
+                            parse_number(data["dpPositivGetestet"]))
+
+
+def render_region_distribution(data):
+    '''Renders the distribution over the states of /regiondistribution'''
+    return string_assembler(data["dpBundesland"],
+                            data["BundeslandVersion"],
+                            parse_number(data["dpAktuelleErkrankungen"]),
+                            lookup=const.REGION_TRANSLATION,
+                            ordered=True)
+
+
+def get_files(urls):
+    """
+    Returns the (data, version)-tuples of the dashboard-files, the versions
+    were worked out when the files got into the cache
+    """
+    return get_data_js_files([const.DASHBOARD_URL_PREFIX + url
+                              for url in urls])
+
+
+def merge(files):
+    '''Merges the data of the (data, version)-tuples into one dict'''
+    data = {}
+    for file, _ in files:
+        data.update(file)
+
+    return data
+
+
+def get_response(name, urls, render):
+    '''Returns the rendered response of the dashboard-files'''
+    files = get_files(urls)
+    versions = tuple(version for _, version in files)
+
+    # the files are only merged if the response has to be rendered
+    return render_cache.get(name, versions, lambda: render(merge(files)))
+
+
+def caseinfo():
+    """
+    Returns the response of /caseinfo, yesterdays data comes from the
+    snapshots loaded by Yesterday.refresh
+    """
+    files = get_files(const.EPIDEMIC_OVERVIEW_URLS)
+    yesterday_data, yesterday_version = yesterday.snapshot
+
+    # a new snapshot of yesterday changes the response as well
+    versions = tuple(version for _, version in files) + (yesterday_version,)
+
+    return render_cache.get("caseinfo", versions,
+                            lambda: render_caseinfo(merge(files),
+                                                    yesterday_data))
+
+
+def age_distribution():
+    '''Returns the response of /agedistribution'''
+    return get_response("agedistribution", const.AGE_DISTRIBUTION_URLS,
+                        render_age_distribution)
+
+
+def region_distribution():
+    '''Returns the response of /regiondistribution'''
+    return get_response("regiondistribution",
+                        const.REGION_DISTRIBUTION_URLS,
+                        render_region_distribution)
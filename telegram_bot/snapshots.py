@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Snapshots of the dashboard-files in the database. Every new version of a
+file is saved once, so the bot can start without the dashboard and compare
+the current data with the data of the day before
+"""
+
+import json
+import logging
+import time
+
+import constants as const
+from constants import Database as db_const
+from constants import Logging as logg_const
+from utils import (dashboard_cache, dashboard_executor, execute, fetch_one,
+                   get_version)
+
+
+def save_snapshot(connection, url, data, fetched, version=None):
+    """
+    Saves a version of a file, returns False if it was already saved. The
+    version is worked out from the data if it is not given
+    """
+    if version is None:
+        version = get_version(data)
+
+    saved = execute(connection, db_const.INSERT_DASHBOARD_SNAPSHOT,
+                    {"url": url, "version": version, "fetched": fetched,
+                     "data": json.dumps(data, ensure_ascii=False,
+                                        separators=(",", ":"))}) > 0
+
+    if saved:
+        logging.info(logg_const.DASHBOARD_SNAPSHOT_SAVED.format(
+            version=version, url=url))
+
+    return saved
+
+
+def ingest(database, urls=const.DASHBOARD_URLS):
+    """
+    Saves the current data of the files, the data comes from the cache so
+    this only downloads files that are not cached. Returns the number of
+    new versions
+    """
+    # the files are fetched before the transaction, so the database is not
+    # locked while waiting for the dashboard. The cache knows their versions
+    files = list(dashboard_executor.map(
+        lambda url: dashboard_cache.get_versioned(
+            const.DASHBOARD_URL_PREFIX + url), urls))
+    fetched = time.time()
+
+    with database.writer() as connection:
+        return sum(save_snapshot(connection, url, data, fetched, version)
+                   for url, (data, version) in zip(urls, files))
+
+
+def load_snapshot(connection, url, before):
+    """
+    Returns the newest snapshot of a file fetched before the given time as
+    (fetched, data)-tuple, or None if there is none
+    """
+    result = fetch_one(connection, db_const.GET_DASHBOARD_SNAPSHOT,
+                       {"url": url, "before": before})
+
+    if result is None:
+        return None
+
+    return result[0], json.loads(result[1])
+
+
+def warm_start(connection, cache, urls=const.DASHBOARD_URLS):
+    """
+    Puts the newest snapshot of every file into the cache, old snapshots
+    are refreshed in the background on their first use
+    """
+    now = time.time()
+    count = 0
+
+    for url in urls:
+        snapshot = load_snapshot(connection, url, now)
+
+        if snapshot is not None:
+            fetched, data = snapshot
+            cache.preload(const.DASHBOARD_URL_PREFIX + url, data,
+                          max(0.0, now - fetched))
+            count += 1
+
+    logging.info(logg_const.DASHBOARD_WARM_START.format(count=count))
+
+    return count
+
+
+def load_yesterday(connection, urls):
+    """
+    Returns the merged data of the files as it was at least a day ago, or
+    None if there is no such snapshot for one of the files
+    """
+    before = time.time() - const.SNAPSHOT_COMPARE_AGE
+    result = {}
+
+    for url in urls:
+        snapshot = load_snapshot(connection, url, before)
+
+        if snapshot is None:
+            return None
+
+        result.update(snapshot[1])
+
+    return result
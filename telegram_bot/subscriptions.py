@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+The subscriptions of all users in memory, by region and by user. The
+fan-out of the alerts and the listing of subscriptions read from here, the
+database stays the source of truth and the index gets checked against it
+"""
+
+import logging
+import threading
+
+from constants import Database as db_const
+from constants import Logging as logg_const
+from utils import fetch_all
+
+
+def load(connection):
+    """
+    Returns the subscriptions of the database as region -> set of users
+    and user -> sorted tuple of regions dicts, and the set of inactive users
+    """
+    by_region = {}
+    by_user = {}
+
+    for user_id, region_id in fetch_all(connection,
+                                        db_const.GET_ALL_SUBSCRIPTIONS):
+        by_region.setdefault(region_id, set()).add(user_id)
+        by_user.setdefault(user_id, []).append(region_id)
+
+    # most users only have a few regions, a tuple takes a third of the
+    # memory of a set
+    for user_id, regions in by_user.items():
+        by_user[user_id] = tuple(sorted(regions))
+
+    inactive = {row[0] for row in fetch_all(connection,
+                                            db_const.GET_INACTIVE_USERS)}
+
+    return by_region, by_user, inactive
+
+
+class SubscriptionIndex():
+    """
+    Keeps region -> users and user -> regions in sync with the
+    subscriptions-table. The changes have to be applied in the transaction
+    that writes them, so a reconcile never sees the index behind the
+    database
+    """
+
+    def __init__(self):
+        self.by_region = {}
+        self.by_user = {}
+
+        # chats that blocked the bot, they keep their subscriptions but get
+        # no alerts
+        self.inactive = set()
+        self.lock = threading.Lock()
+
+    def load(self, connection):
+        '''Replaces the index with the subscriptions of the database'''
+        by_region, by_user, inactive = load(connection)
+
+        with self.lock:
+            self.by_region = by_region
+            self.by_user = by_user
+            self.inactive = inactive
+
+        logging.info(logg_const.SUBSCRIPTIONS_LOADED.format(
+            users=len(by_user), regions=len(by_region),
+            subscriptions=sum(len(users) for users in by_region.values())))
+
+    def reconcile(self, connection):
+        """
+        Compares the index with the database and replaces it if they differ,
+        returns the number of users whose subscriptions or state differed.
+        This has to run in a writer-transaction, so no write happens between
+        loading and comparing
+        """
+        by_region, by_user, inactive = load(connection)
+
+        with self.lock:
+            differences = sum(
+                1 for user_id in by_user.keys() | self.by_user.keys()
+                if by_user.get(user_id) != self.by_user.get(user_id))
+            differences += len(inactive ^ self.inactive)
+
+            if differences > 0:
+                self.by_region = by_region
+                self.by_user = by_user
+                self.inactive = inactive
+
+        if differences > 0:
+            logging.warning(logg_const.SUBSCRIPTIONS_DRIFT.format(
+                count=differences))
+
+        return differences
+
+    def add(self, user_id, region_id):
+        '''Adds a subscription'''
+        with self.lock:
+            self.by_region.setdefault(region_id, set()).add(user_id)
+
+            regions = set(self.by_user.get(user_id, ()))
+            regions.add(region_id)
+            self.by_user[user_id] = tuple(sorted(regions))
+
+    def remove(self, user_id, region_id):
+        '''Removes a subscription, empty entries are dropped'''
+        with self.lock:
+            self.discard(region_id, user_id)
+
+            regions = tuple(region for region
+                            in self.by_user.get(user_id, ())
+                            if region != region_id)
+            if len(regions) > 0:
+                self.by_user[user_id] = regions
+            else:
+                self.by_user.pop(user_id, None)
+
+    def remove_user(self, user_id):
+        '''Removes all subscriptions of a user'''
+        with self.lock:
+            for region_id in self.by_user.pop(user_id, ()):
+                self.discard(region_id, user_id)
+
+    def discard(self, region_id, user_id):
+        '''Removes the user from the region, called with the lock'''
+        users = self.by_region.get(region_id)
+
+        if users is not None:
+            users.discard(user_id)
+
+            if len(users) == 0:
+                del self.by_region[region_id]
+
+    def set_active(self, user_id, active):
+        '''Marks a chat as active or inactive'''
+        with self.lock:
+            if active:
+                self.inactive.discard(user_id)
+            else:
+                self.inactive.add(user_id)
+
+    def regions(self, user_id):
+        '''Returns the regions the user subscribed to'''
+        with self.lock:
+            return self.by_user.get(user_id, ())
+
+    def subscribers(self, region_id):
+        '''Returns the active users that subscribed to the region'''
+        with self.lock:
+            return self.by_region.get(region_id, set()) - self.inactive
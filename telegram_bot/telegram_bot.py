@@ -9,7 +9,6 @@ A telegram-bot to inform about updates of the austrian corona-ampel
 from datetime import datetime
 import json
 import logging
-import sqlite3
 import threading
 import time
 
@@ -19,6 +18,7 @@ import telegram
 from telegram import InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler, CommandHandler, MessageHandler
 from telegram.ext import Filters, Updater
+from telegram.utils.request import Request
 
 
 import constants as const
@@ -26,8 +26,16 @@ from constants import Database as db_const
 from constants import Logging as logg_const
 from constants import TelegramConstants as tele_const
 import data_builder
+import delivery
+import migrations
+import notifications
+import outbox
+import region_index
+import responses
+import snapshots
+import subscriptions
 import utils
-from utils import execute_query, get_data_js, string_assembler
+from utils import execute, fetch_one
 
 
 def get_username(chat):
@@ -43,19 +51,27 @@ def get_username(chat):
 class TelegramBot(threading.Thread):
     '''Class for the telegram-bot'''
 
-    def __init__(self, token, sql_path):
+    def __init__(self, token, sql_path, external_delivery=False,
+                 region_search=const.REGION_SEARCH_MEMORY):
         '''Initiate the bot, register all the handlers and start polling'''
 
         # Initialize all base classes
         super().__init__()
 
         self.running = False
+
+        # if the alert-messages are send by standalone delivery-workers, the
+        # bot only puts them into the outbox
+        self.external_delivery = external_delivery
         logging.info(logg_const.STARTING_BOT)
 
         # TODO: check if the bot and the dispatcher/updater can be created
         # more easily
         # Get a bot for later use in the update-function
-        self.bot = telegram.Bot(token=token)
+        # the delivery-queue sends over this bot from several threads at
+        # once, so it needs a connection per thread
+        self.bot = telegram.Bot(token=token, request=Request(
+            con_pool_size=const.DELIVERY_WORKERS + const.BOT_POOL_HEADROOM))
 
         # get updater and dispatcher running
         self.updater = Updater(token=token, use_context=True)
@@ -63,6 +79,12 @@ class TelegramBot(threading.Thread):
 
         logging.info(logg_const.REGISTER_HANDLER)
 
+        # every command reactivates a chat that was marked as inactive, this
+        # runs in its own group before the actual command-handlers
+        self.dispatcher.add_handler(MessageHandler(Filters.command,
+                                                   self.reactivate_chat),
+                                    group=-1)
+
         # Telegram-Command handler
         self.dispatcher.add_handler(CommandHandler('help', self.cmd_help))
         self.dispatcher.add_handler(CommandHandler('caseinfo',
@@ -90,7 +112,46 @@ class TelegramBot(threading.Thread):
         self.dispatcher.add_handler(CallbackQueryHandler(self.command_handler))
         logging.info(logg_const.REGISTERED_HANDLER)
 
-        # start a background scheduler for pulling updates from the database
+        # the alert-messages are send in parallel by a rate-limited queue,
+        # the messages are taken from the outbox with leases of this owner
+        self.delivery = delivery.DeliveryQueue(self.bot)
+        self.delivery.start()
+        self.outbox_owner = outbox.get_owner_name("bot")
+
+        # connect to the database and bring the schema up to date, every
+        # thread reads over its own connection, writes are serialized
+        self.database = utils.ConnectionManager(sql_path)
+        with self.database.writer() as connection:
+            migrations.migrate(connection)
+
+        # the municipalities are searched in memory, the index gets rebuilt
+        # whenever the regions change. Or with the full-text index of the
+        # database, which the ingest keeps in sync
+        if region_search == const.REGION_SEARCH_FTS:
+            self.region_index = region_index.FtsRegionSearch(self.database)
+        else:
+            self.region_index = region_index.RegionIndex()
+        self.region_index.refresh(self.database.reader())
+
+        # the buttons only carry the GKZ, the names are looked up here
+        self.region_names = region_index.RegionNames()
+        self.region_names.refresh(self.database.reader())
+
+        # the subscriptions are read from memory, every write to them also
+        # updates the index, chats pruned by the delivery included. A job
+        # checks it against the database for the writes of an external
+        # delivery-worker, see below
+        self.subscriptions = subscriptions.SubscriptionIndex()
+        self.subscriptions.load(self.database.reader())
+
+        # the last saved dashboard-data is used until it got refreshed, so
+        # no command has to wait for the dashboard after a restart
+        snapshots.warm_start(self.database.reader(), utils.dashboard_cache)
+        responses.yesterday.refresh(self.database.reader())
+
+        # start a background scheduler for pulling updates from the database.
+        # It is started last, so no job runs before everything it uses is
+        # set up
         self.scheduler = BackgroundScheduler()
 
         # Run the job every hour at the two minute mark
@@ -98,16 +159,21 @@ class TelegramBot(threading.Thread):
         # the users
         self.scheduler.add_job(self.pull_updates, 'cron',
                                minute="2", second="0")
-        # this job clears the cached information from the covid dashbaord
-        # this will be cleared every hour.
-        self.scheduler.add_job(get_data_js.cache_clear, 'cron',
-                               minute="0", second="0")
+        # this job reloads the cached information from the covid dashbaord
+        # before it expires, so no user has to wait for the dashboard
+        self.scheduler.add_job(self.refresh_dashboard_cache, 'interval',
+                               seconds=const.DASHBOARD_CACHE_CHECK)
+        # this job checks the subscription-index against the database
+        self.scheduler.add_job(self.reconcile_subscriptions, 'interval',
+                               seconds=const.SUBSCRIPTION_RECONCILE_INTERVAL)
+
+        # resume the delivery of messages left in the outbox by the last
+        # run, this runs once right after the start
+        if not self.external_delivery:
+            self.scheduler.add_job(self.deliver_outbox)
+
         self.scheduler.start()
 
-        # connect to the database
-        self.sqlite_connection = sqlite3.connect(sql_path,
-                                                 check_same_thread=False)
-    
     def cmd_caseinfo(self, update, context):
         '''Used to inform about the current pandemic'''
 
@@ -119,56 +185,9 @@ class TelegramBot(threading.Thread):
         user_id = update.effective_chat.id
         logging.info(logg_const.USER_SEND_MSG.format(username=user_name,
                                                      msg=message))
-        result_data = {}
-
-        # get the information from the dashboard
-        for url in const.EPIDEMIC_OVERVIEW_URLS:
-            request_result = get_data_js(const.DASHBOARD_URL_PREFIX + url)
-            result_data = dict(result_data, **request_result)
-
-        # store it in variables for later use
-        total_tests = result_data["dpGesTestungen"]
-        pos_tests_total = int(
-            result_data["dpPositivGetestet"].replace(
-                ".", ""))
-        confirmed_cases_quarantine = int(
-            result_data["dpBFNH"].replace(".", ""))
-        pos_tests_crr = int(
-            result_data["dpAktuelleErkrankungen"].replace(
-                ".", ""))
-        persons_hospital = pos_tests_crr - confirmed_cases_quarantine
-
-        avail_int_care = int(result_data["dpGesIBVerf"].replace(".", ""))
-
-        int_care_curr_use = int(result_data["dpGesIBBel"].replace(".", ""))
-        int_care_percent = result_data["dpAktuelleErkrankungen"]
-        avail_care = int(result_data["dpGesNBVerf"].replace(".", ""))
-        care_curr_use = int(result_data["dpGesNBBel"].replace(".", ""))
-        female = result_data["dpGeschlechtsverteilung"][0]["y"]
-        male = result_data["dpGeschlechtsverteilung"][1]["y"]
-        update_time = result_data["GesamtzahlTestungenVersion"].split("V")[0]
-        tests_perc = (100 / (pos_tests_total / pos_tests_crr))
-
-        int_care_percent = (100 / (avail_int_care / int_care_curr_use))
-        care_percent = (100 / (avail_care / care_curr_use))
-
-        # format the string accordingly
-        caseinfo = tele_const.EPIDEMIC_OVERVIEW.format(
-            tests_total=total_tests,
-            pos_tests_total=pos_tests_total,
-            pos_tests_curr=pos_tests_crr,
-            tests_perc=tests_perc,
-            hospital=persons_hospital,
-            avail_int_care=avail_int_care,
-            int_care_curr_use=int_care_curr_use,
-            int_care_percent=int_care_percent,
-            avail_care=avail_care,
-            care_percent=care_percent,
-            care_curr_use=care_curr_use,
-            female=female,
-            male=male,
-            update_time=update_time
-        )
+        # the response is only rendered again if the dashboard published
+        # new data
+        caseinfo = responses.caseinfo()
 
         # send the message to the user
         context.bot.send_message(chat_id=user_id,
@@ -183,24 +202,7 @@ class TelegramBot(threading.Thread):
         logging.info(logg_const.USER_SEND_MSG.format(username=user_name,
                                                      msg=message))
 
-        # get some variables for easier logging
-        age_dist_url = const.DASHBOARD_URL_PREFIX + const.AGE_DISTRIBUTION
-        age_data = get_data_js(age_dist_url)
-
-        # get the current region-data and number of infected people
-        infected_url = const.DASHBOARD_URL_PREFIX + const.TOTAL_POSITIV_URL
-        infected_data = get_data_js(infected_url)
-
-        # preprocess the number of currently infected persons
-
-        total_infected = infected_data["dpPositivGetestet"]\
-            .replace(".", "")
-        total_infected = int(total_infected)
-
-        # assemble the string
-        response_str = string_assembler(age_data["dpAltersverteilung"],
-                                        age_data["AltersverteilungVersion"],
-                                        total_infected)
+        response_str = responses.age_distribution()
 
         context.bot.send_message(chat_id=user_id,
                                  text=response_str)
@@ -215,30 +217,29 @@ class TelegramBot(threading.Thread):
         logging.info(logg_const.USER_SEND_MSG.format(username=user_name,
                                                      msg=message))
 
-        # get the current region-data and number of infected people
-        reg_dist_url = const.DASHBOARD_URL_PREFIX + const.REGION_DISTRIBUTION
-        region_data = get_data_js(reg_dist_url)
+        response_str = responses.region_distribution()
 
-        cur_infected_url = const.DASHBOARD_URL_PREFIX + \
-            const.CURRENT_POSITIV_URL
+        context.bot.send_message(chat_id=user_id,
+                                 text=response_str)
 
-        cur_infected_data = get_data_js(cur_infected_url)
+    def reactivate_chat(self, update, context):
+        '''Marks a chat as active again once it sends a command'''
+        user_id = update.effective_chat.id
 
-        # preprozess the number of currently infected persons
-        total_infected = cur_infected_data["dpAktuelleErkrankungen"]\
-            .replace(".", "")
+        # almost every chat is active, so the writer is only needed for the
+        # few chats that come back
+        result = fetch_one(self.database.reader(),
+                           db_const.LOOKUP_USER_ACTIVE,
+                           {"user_id": user_id})
 
-        total_infected = int(total_infected)
+        if result is None or result[0] == 1:
+            return
 
-        # assemble the string
-        response_str = string_assembler(region_data["dpBundesland"],
-                                        region_data["BundeslandVersion"],
-                                        total_infected,
-                                        lookup=const.REGION_TRANSLATION,
-                                        ordered=True)
+        with self.database.writer() as connection:
+            execute(connection, db_const.ACTIVATE_USER, {"user_id": user_id})
+            self.subscriptions.set_active(user_id, True)
 
-        context.bot.send_message(chat_id=user_id,
-                                 text=response_str)
+        logging.info(logg_const.CHAT_REACTIVATED.format(chat_id=user_id))
 
     def cmd_help(self, update, context):
         '''
@@ -265,20 +266,19 @@ class TelegramBot(threading.Thread):
         logging.info(logg_const.USER_SEND_MSG.format(username=user_name,
                                                      msg=message))
 
-        regions_query = db_const.REGIONS_QUERY.format(user_id=user_id)
-        result = execute_query(self.sqlite_connection, regions_query)
+        result = self.subscribed_regions(user_id)
 
         if(len(result) > 0):
             # mehr als eine Region
             response = tele_const.USER_SUBSCRIPTIONS
 
             for item in result:
-                warn_quarry = db_const.CHECK_WARNING.format(region_id=item[1])
-                warn_result = execute_query(
-                    self.sqlite_connection, warn_quarry)
+                warn_result = fetch_one(self.database.reader(),
+                                        db_const.CHECK_WARNING,
+                                        {"region_id": item[1]})
 
                 response += tele_const.LIST_REGION.format(
-                    alert_level=const.ALERT_COLORS[warn_result[0][3]],
+                    alert_level=const.ALERT_COLORS[warn_result[3]],
                     region_name=item[0])
 
             context.bot.send_message(chat_id=user_id,
@@ -328,10 +328,9 @@ class TelegramBot(threading.Thread):
         # multiple words
         region_name = " ".join(context.args).strip('"')
 
-        regions_query = db_const.SEARCH_REGIONS.format(region_name=region_name)
-
-        cmd_button_list = utils.region_cmd_buttons(
-            self.sqlite_connection, regions_query, tele_const.CMD_SUB_PREFIX)
+        # the search runs over the in-memory index of the municipalities
+        cmd_button_list = utils.region_buttons(
+            self.region_index.search(region_name), tele_const.CMD_SUB_PREFIX)
 
         if cmd_button_list is None:
             region_not_found = tele_const.NO_REGION_FOUND.format(
@@ -394,9 +393,11 @@ class TelegramBot(threading.Thread):
         # Check if the user wants to unsubscribe from all regions
         elif len(context.args) == 1:
             if(context.args[0] == "all"):
-                unsub_all_quarry = db_const.UBSUB_USER_ALL_REGION.format(
-                    user_id=user_id)
-                execute_query(self.sqlite_connection, unsub_all_quarry)
+                with self.database.writer() as connection:
+                    execute(connection,
+                            db_const.UBSUB_USER_ALL_REGION,
+                            {"user_id": user_id})
+                    self.subscriptions.remove_user(user_id)
 
                 context.bot.send_message(chat_id=user_id,
                                          text=tele_const.USER_UNSUBSCRIBE_ALL)
@@ -410,11 +411,8 @@ class TelegramBot(threading.Thread):
 
         # If there are no arguments, than the user has to choose
         else:
-            regions_query = db_const.REGIONS_QUERY.format(user_id=user_id)
-
-            cmd_button_list = utils.region_cmd_buttons(
-                self.sqlite_connection, regions_query,
-                tele_const.CMD_UNSUB_PREFIX)
+            cmd_button_list = utils.region_buttons(
+                self.subscribed_regions(user_id), tele_const.CMD_UNSUB_PREFIX)
 
             if cmd_button_list is None:
                 context.bot.send_message(
@@ -442,75 +440,112 @@ class TelegramBot(threading.Thread):
         # master/examples/inlinekeyboard.py
         query.answer()
 
-        command = query.data.split("_")
+        # the callback-data is an opcode and its argument, see
+        # utils.encode_callback
+        command = utils.decode_callback(query.data)
+
+        if command is None:
+            logging.warning(logg_const.INVALID_CALLBACK.format(
+                data=query.data))
+            return None
+
+        opcode, argument = command
 
         # If the issued command is a subscription, than this block needs to be
         # run
-        if(command[0] == tele_const.CMD_SUB_PREFIX):
+        if(opcode == tele_const.CMD_SUB_PREFIX):
 
             # bevor we register the user, wen need to check if he is already in
             # our userdatabase, it not, he weill be inserted into it on his
             # first subscription
-            result = execute_query(self.sqlite_connection,
-                                   db_const.LOOKUP_USER.format(user_id=user_id)
-                                   )
-            # if the length of the result is 0, than the user is not in
-            # the database and has to be registered
-            if len(result) == 0:
-                # Execute the insert-quarry, replacing the placeholders with
-                # the users id and username
-                execute_query(self.sqlite_connection,
-                              db_const.INSERT_USER.format(id=user_id,
-                                                          name=username))
-
-                logging.info(logg_const.REGISTERED_USER.format(name=username,
-                                                               id=user_id))
-            # get the id of the region for the quarry
-            reg_id = command[1]
-            lookup_reg = db_const.SUB_USER_REGION_LOOKUP.format(
-                user_id=user_id, region_id=reg_id)
-
-            # execute the quary
-            result = execute_query(self.sqlite_connection, lookup_reg)
-
-            # Check if the subscription is already registered
-            if len(result) == 0:
-                # it not, than insert the user subscription into the database
-                insert_query = db_const.SUB_USER_REGION_INSERT
-                result = execute_query(
-                    self.sqlite_connection, insert_query.format(
-                        user_id=user_id, region_id=command[1]))
-
+            # get the id of the region for the quarry, and its name
+            reg_id = int(argument, 36)
+            reg_name = self.region_names.name(reg_id)
+
+            # only known regions can be subscribed
+            if reg_name is None:
+                logging.warning(logg_const.INVALID_CALLBACK.format(
+                    data=query.data))
+                return None
+
+            # the registration of the user and the subscription are commited
+            # together
+            with self.database.writer() as connection:
+                result = fetch_one(connection,
+                                   db_const.LOOKUP_USER,
+                                   {"user_id": user_id})
+                # if there is no result, than the user is not in the database
+                # and has to be registered
+                if result is None:
+                    # Execute the insert-quarry with the users id and
+                    # username
+                    execute(connection, db_const.INSERT_USER,
+                            {"id": user_id, "name": username})
+
+                    logging.info(logg_const.REGISTERED_USER.format(
+                        name=username, id=user_id))
+
+                # execute the quary
+                result = fetch_one(connection,
+                                   db_const.SUB_USER_REGION_LOOKUP,
+                                   {"user_id": user_id, "region_id": reg_id})
+
+                # Check if the subscription is already registered
+                subscribed = result is None
+                if subscribed:
+                    # it not, than insert the user subscription into the
+                    # database
+                    execute(connection,
+                            db_const.SUB_USER_REGION_INSERT,
+                            {"user_id": user_id, "region_id": reg_id})
+                    self.subscriptions.add(user_id, reg_id)
+
+            if subscribed:
                 # and tell him about the registration
-                response = tele_const.REGISTERED.format(region_name=command[2])
+                response = tele_const.REGISTERED.format(region_name=reg_name)
                 query.edit_message_text(text=response)
 
                 logging.info(
                     logg_const.USER_SUB.format(
                         user_name=username,
-                        region_name=command[2]))
+                        region_name=reg_name))
             else:
                 query.edit_message_text(text=tele_const.ALREADY_REGISTERED)
 
         # check if the command is a unsusbcribe_command
-        elif(command[0] == tele_const.CMD_UNSUB_PREFIX):
+        elif(opcode == tele_const.CMD_UNSUB_PREFIX):
+            reg_id = int(argument, 36)
+
             # if it is the unsusbcribe-command, issue an quarry and delete the
             # entry in the database (subscription)
-            del_query = db_const.UBSUB_USER_REGION.format(region_id=command[1],
-                                                          user_id=user_id)
+            with self.database.writer() as connection:
+                execute(connection, db_const.UBSUB_USER_REGION,
+                        {"region_id": reg_id, "user_id": user_id})
+                self.subscriptions.remove(user_id, reg_id)
 
-            result = execute_query(self.sqlite_connection, del_query)
-
-            # get the name of the region the user unsubscribed from
-            reg_name = command[2]
+            # get the name of the region the user unsubscribed from, regions
+            # removed by the last ingest are named by their GKZ
+            reg_name = self.region_names.name(reg_id) or str(reg_id)
 
             # tell him about the unsusbcription and log the event
             reply = tele_const.USER_UNSUBSCRIPTION.format(region_name=reg_name)
             query.edit_message_text(text=reply)
             logging.info(logg_const.USER_UNSUB.format(user_name=username,
-                                                      region_name=command[2]))
+                                                      region_name=reg_name))
+        # the user wants to see another page of a search-result, the result
+        # is taken from the result-store instead of searching again
+        elif(opcode == tele_const.CMD_PAGE_PREFIX):
+            token, page = argument.split(".")
+            cmd_button_list = utils.region_page_buttons(token, int(page, 36))
+
+            if cmd_button_list is None:
+                query.edit_message_text(text=tele_const.RESULTS_EXPIRED)
+            else:
+                query.edit_message_reply_markup(
+                    reply_markup=InlineKeyboardMarkup(cmd_button_list))
+
         # check if the command is just the cancel-operation command
-        elif(command[0] == tele_const.CMD_PREFIX_CANCEL):
+        elif(opcode == tele_const.CMD_CANCEL_PREFIX):
             query.edit_message_text(text=tele_const.CANCEL_OPERATION)
 
         return None
@@ -531,76 +566,86 @@ class TelegramBot(threading.Thread):
         self.updater.stop()
         self.dispatcher.stop()
         self.scheduler.shutdown(wait=False)
+        self.delivery.stop()
 
         logging.info("Stopped bot, closing database connection ...")
         # Close the connection to the database
-        self.sqlite_connection.close()
+        self.database.close()
         logging.info("Database connection closed!")
 
     def pull_updates(self):
         '''Pull updates from the database regarding new alert-levels'''
 
-        # get all regions, that are not already red
-        result = execute_query(self.sqlite_connection,
-                               db_const.GET_UPDATED_REGIONS)
-
-        for region in result:
-            region_id = region[0]
-
-            lookup_quarry = db_const.LOOKUP_REGION_SUBSCRIPTIONS.format(
-                region_id=region_id)
+        # the regions may have changed with the last ingest
+        self.region_index.refresh(self.database.reader())
+        self.region_names.refresh(self.database.reader())
+
+        # get all pending notifications at once, regions without any
+        # subscribers do not show up at all. Every user gets one digest with
+        # all their changed regions. The messages are put into the outbox
+        # in the same transaction that marks the updates as read, so no
+        # update gets lost or send twice
+        with self.database.writer() as connection:
+            last_update, pending = notifications.plan_notifications(
+                connection, self.subscriptions)
+            digests = notifications.build_digests(pending)
+
+            for user_id, region_names, _ in digests:
+                logging.info(
+                    logg_const.USER_UPDATE.format(
+                        chat_id=user_id,
+                        region_name=", ".join(region_names)))
 
-            lookup_result = execute_query(self.sqlite_connection,
-                                          lookup_quarry)
+            outbox.enqueue_digests(connection, digests)
+            notifications.mark_updates_as_read(connection, last_update)
 
-            # If the lookup does not yield any subscribed user, skip the
-            # further lookup, since there is no user to inform
-            if len(lookup_result) == 0:
-                # This should be here, so that even unregistered regions get
-                # marked as read
-                mark_update_as_read = db_const.MARK_UPDATE_AS_READ.format(
-                    region_id=region_id)
+        if not self.external_delivery:
+            self.deliver_outbox()
 
-                execute_query(self.sqlite_connection, mark_update_as_read)
-                continue
+    def subscribed_regions(self, user_id):
+        '''Returns the (name, id)-tuples of the subscriptions of a user'''
+        return sorted((self.region_names.name(region_id) or str(region_id),
+                       region_id)
+                      for region_id in self.subscriptions.regions(user_id))
 
-            update = db_const.GET_REGIONUPDATES.format(id=region_id)
+    def reconcile_subscriptions(self):
+        '''Checks the subscription-index against the database'''
 
-            state_result = execute_query(self.sqlite_connection, update)
+        # in a writer-transaction, so no subscription changes meanwhile
+        with self.database.writer() as connection:
+            self.subscriptions.reconcile(connection)
 
-            response = None
-            region_name = state_result[0][0]
-            bevor_color = const.ALERT_COLORS[state_result[1][1]]
-            after_color = const.ALERT_COLORS[state_result[0][1]]
-            url = const.ALERT_URL[state_result[0][1]]
+    def refresh_dashboard_cache(self):
+        '''Reload the dashboard-data that is about to expire'''
+        utils.dashboard_cache.refresh_due()
 
-            response = ""
-            # the newer level is higher than the older one, the level has risen
-            if state_result[0][1] > state_result[1][1]:
-                response = tele_const.REGION_HIGHER_ALERT
-            else:
-                response = tele_const.REGION_LOWER_ALERT
+        # new versions of the dashboard-files are saved as snapshots, the
+        # comparison of /caseinfo moves on to the ones a day old
+        snapshots.ingest(self.database)
+        responses.yesterday.refresh(self.database.reader())
 
-            response += tele_const.REGION_ALERT_BODY.format(
-                city_name=region_name,
-                level1=bevor_color,
-                level2=after_color,
-                url_link=url)
+        logging.info(logg_const.CACHE_STATS.format(
+            **utils.dashboard_cache.stats()))
 
-            for user in lookup_result:
-                logging.info(
-                    logg_const.USER_UPDATE.format(
-                        username=user[1],
-                        region_name=region_name))
+    def deliver_outbox(self):
+        '''Deliver the pending messages of the outbox'''
 
-                self.bot.send_message(chat_id=user[0],
-                                      text=response)
+        # the messages are send outside of any transaction, so that the
+        # database is not locked while talking to telegram
+        outbox.deliver_pending(self.database, self.delivery,
+                               self.outbox_owner,
+                               on_pruned=self.chat_pruned)
 
-            # mark region as read
-            mark_update_as_read = db_const.MARK_UPDATE_AS_READ.format(
-                region_id=region_id)
+        logging.info(logg_const.DELIVERY_STATS.format(
+            **self.delivery.stats()))
 
-            execute_query(self.sqlite_connection, mark_update_as_read)
+    def chat_pruned(self, chat_id):
+        """
+        Takes a chat that blocked the bot out of the fan-out, called inside
+        the transaction that marks it as inactive in the database
+        """
+        self.subscriptions.set_active(chat_id, False)
+        self.delivery.chat_pruned(chat_id)
 
 
 def main():
@@ -619,7 +664,11 @@ def main():
 
     # initialize the bot
     telegram_bot = TelegramBot(configurations["telegram-token"],
-                               configurations["database_path"])
+                               configurations["database_path"],
+                               configurations.get("external_delivery",
+                                                  False),
+                               configurations.get("region_search",
+                                                  const.REGION_SEARCH_MEMORY))
     telegram_bot.daemon = True
 
     # start the bot-thread
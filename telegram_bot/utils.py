@@ -6,51 +6,340 @@ A utility file for the coronaampel-bot project
 """
 
 import ast
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import json
 import logging
+import re
 import requests
 import sqlite3
+import threading
+import time
+import uuid
 
 from telegram import InlineKeyboardButton
+import constants as const
 from constants import Database as db_const
+from constants import Logging as logg_const
 from constants import TelegramConstants as tele_const
 
 
-def execute_query(connection, query):
-    '''Execute Quarry's on the database'''
+class Connection(sqlite3.Connection):
+    '''A sqlite-connection that keeps track of its nested transactions'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # number of transactions and savepoints that are currently open
+        self.transaction_depth = 0
+
+
+def connect(sql_path, read_only=False, **kwargs):
+    """
+    Open a connection to the database, the connection keeps the compiled
+    statements of the parameterized queries in its statement-cache.
+    Statements outside of a transaction get commited on their own
+    """
+    connection = sqlite3.connect(sql_path,
+                                 factory=Connection,
+                                 isolation_level=None,
+                                 timeout=const.DATABASE_TIMEOUT,
+                                 cached_statements=const.STATEMENT_CACHE_SIZE,
+                                 **kwargs)
+
+    for pragma in db_const.CONNECTION_PRAGMAS:
+        connection.execute(pragma)
+
+    if read_only:
+        connection.execute(db_const.READ_ONLY_PRAGMA)
+
+    return connection
+
+
+class ConnectionManager():
+    """
+    Hands out one read-connection per thread and a single writer-connection
+    which is only used by one thread at a time
+    """
+
+    def __init__(self, sql_path):
+        self.sql_path = sql_path
+
+        # every thread gets its own read-connection, they are all kept in a
+        # list so that they can be closed
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+
+        # all writes are serialized over this connection, the lock can be
+        # taken multiple times by the same thread for nested transactions
+        self.writer_lock = threading.RLock()
+        self.writer_connection = connect(sql_path, check_same_thread=False)
+
+    def reader(self):
+        '''Returns the read-connection of the current thread'''
+        connection = getattr(self.local, "connection", None)
+
+        if connection is None:
+            connection = connect(self.sql_path, read_only=True,
+                                 check_same_thread=False)
+            self.local.connection = connection
+
+            with self.readers_lock:
+                self.readers.append(connection)
+
+        return connection
+
+    @contextmanager
+    def writer(self):
+        """
+        Locks the writer-connection and opens a transaction on it, which
+        gets commited at the end of the with-block
+        """
+        with self.writer_lock:
+            with transaction(self.writer_connection):
+                yield self.writer_connection
+
+    def close(self):
+        '''Closes all connections'''
+        with self.readers_lock:
+            for connection in self.readers:
+                connection.close()
+            self.readers = []
+
+        with self.writer_lock:
+            self.writer_connection.close()
+
+
+@contextmanager
+def transaction(connection):
+    """
+    Groups all statements inside the with-block into one transaction, which
+    gets commited at the end of the block or rolled back on an exception.
+    Nested transactions are implemented with savepoints
+    """
+    depth = connection.transaction_depth
+
+    # only the outermost block opens and commits the transaction
+    if depth == 0:
+        connection.execute(db_const.BEGIN_TRANSACTION)
+    else:
+        connection.execute(db_const.SAVEPOINT.format(depth=depth))
+
+    connection.transaction_depth += 1
+
+    try:
+        yield connection
+
+    except BaseException:
+        connection.transaction_depth -= 1
+
+        if depth == 0:
+            connection.execute(db_const.ROLLBACK_TRANSACTION)
+        else:
+            # rolling back to a savepoint keeps it open, so it has to be
+            # released afterwards
+            connection.execute(db_const.ROLLBACK_SAVEPOINT.format(
+                depth=depth))
+            connection.execute(db_const.RELEASE_SAVEPOINT.format(
+                depth=depth))
+        raise
+
+    connection.transaction_depth -= 1
+
+    if depth == 0:
+        connection.execute(db_const.COMMIT_TRANSACTION)
+    else:
+        connection.execute(db_const.RELEASE_SAVEPOINT.format(depth=depth))
+
+
+def run_query(connection, query, params=None):
+    '''Execute a parameterized Quarry on the database, returns the cursor'''
+
+    if params is None:
+        params = {}
 
-    # get a cursor on the database to work with it
-    cursor = connection.cursor()
-    result = None
     try:
-        # execute the provided quarry on the database, commiting and logging
-        cursor.execute(query)
-        result = cursor.fetchall()
-        logging.info(db_const.QUERY_EXECUTED.format(quary=query))
+        # the query-text is constant, so the compiled statement gets reused
+        # from the statement-cache of the connection
+        cursor = connection.execute(query, params)
+        logging.info(db_const.QUERY_EXECUTED.format(quary=query,
+                                                    params=params))
 
     # throws an exception if something wrong was done, ether by violation
     # of a database contraint or by an invalid quarry
+    except sqlite3.OperationalError as exception:
+        logging.error(db_const.EXCEPTION_MSG.format(exc_name=db_const.OP_ERROR,
+                                                    quary=query,
+                                                    params=params))
+        logging.exception(exception)
+        raise
+
     except sqlite3.DatabaseError as exception:
         logging.error(db_const.EXCEPTION_MSG.format(exc_name=db_const.DB_ERROR,
-                                                    quary=query))
+                                                    quary=query,
+                                                    params=params))
         logging.exception(exception)
+        raise
+
+    return cursor
 
-    except sqlite3.OperationalError as exception:
-        logging.error(db_const.EXCEPTION_MSG.format(exc_name=db_const.OP_ERROR,
-                                                    quary=query))
-        logging.exception(exception)
 
-    connection.commit()
-    return result
+def fetch_one(connection, query, params=None):
+    '''Execute a Quarry and return the first row or None'''
+    return run_query(connection, query, params).fetchone()
 
 
-def region_cmd_buttons(sel_conn, query, cmd_prefix):
+def fetch_all(connection, query, params=None):
+    '''Execute a Quarry and return all rows'''
+    return run_query(connection, query, params).fetchall()
+
+
+def execute(connection, query, params=None):
+    '''Execute a Quarry without a result, returns the number of rows'''
+    return run_query(connection, query, params).rowcount
+
+
+class ExpiringStore():
+    """
+    A thread-safe store in which every value expires after ttl seconds. New
+    values get a short random token, which fits into callback-data
+    """
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        # token -> (expires, value), ordered by insertion and with the same
+        # ttl for all values also by expiry
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def put(self, value):
+        '''Stores the value and returns its token'''
+        token = uuid.uuid4().hex[:8]
+
+        with self.lock:
+            now = time.monotonic()
+
+            # drop the expired values and the oldest ones if still too full
+            for key in list(self.entries):
+                if self.entries[key][0] > now and \
+                        len(self.entries) < self.maxsize:
+                    break
+                del self.entries[key]
+
+            self.entries[token] = (now + self.ttl, value)
+
+        return token
+
+    def get(self, token):
+        '''Returns the value of the token, None if it expired'''
+        with self.lock:
+            entry = self.entries.get(token)
+
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+
+            return entry[1]
+
+
+BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def to_base36(number):
+    '''Returns the base36-representation of a non-negative int'''
+    digits = ""
+
+    while True:
+        number, digit = divmod(number, 36)
+        digits = BASE36_DIGITS[digit] + digits
+
+        if number == 0:
+            return digits
+
+
+def encode_callback(opcode, argument=""):
+    """
+    Returns the callback-data of a button, the one character opcode followed
+    by its argument. A GKZ takes at most four characters in base36
+    """
+    data = opcode + argument
+
+    if len(data.encode()) > const.CALLBACK_DATA_LIMIT:
+        raise ValueError(data)
+
+    return data
+
+
+def region_callback(opcode, region_id):
+    '''Returns the callback-data of a button with a region'''
+    return encode_callback(opcode, to_base36(region_id))
+
+
+def is_base36(text):
+    '''Returns True for a non-empty string of lowercase base36-digits'''
+    return len(text) > 0 and all(digit in BASE36_DIGITS for digit in text)
+
+
+def valid_argument(opcode, argument):
     """
-    Returns a list of inlinekeyboardbuttons that are used to ask the users
-    about cities
+    Checks the argument of an opcode: a base36 GKZ for (un)subscribing,
+    <token>.<base36 page> for paging and nothing for cancelling
     """
-    result = execute_query(sel_conn, query)
+    if opcode in (tele_const.CMD_SUB_PREFIX, tele_const.CMD_UNSUB_PREFIX):
+        return is_base36(argument)
+
+    if opcode == tele_const.CMD_PAGE_PREFIX:
+        parts = argument.split(".")
+        return len(parts) == 2 and is_base36(parts[0]) and \
+            is_base36(parts[1])
+
+    return opcode == tele_const.CMD_CANCEL_PREFIX and argument == ""
 
+
+def decode_callback(data):
+    """
+    Splits the callback-data into the opcode and its argument, returns None
+    for data this bot did not send or with an invalid argument. Buttons of
+    older versions sent <prefix>_<gkz>_<name>, those still work
+    """
+    if "_" in data:
+        command = data.split("_")
+        opcode = tele_const.LEGACY_PREFIXES.get(command[0])
+
+        # the GKZ of the older buttons is a plain decimal, int() would also
+        # take signs and whitespace
+        number = command[1]
+
+        if opcode is None or not (number.isascii() and number.isdigit()):
+            return None
+
+        command = opcode, to_base36(int(number))
+    elif data in tele_const.LEGACY_PREFIXES:
+        command = tele_const.LEGACY_PREFIXES[data], ""
+    else:
+        command = data[:1], data[1:]
+
+    if not valid_argument(*command):
+        return None
+
+    return command
+
+
+# search-results with more than one page, kept for paging
+region_results = ExpiringStore(const.REGION_RESULTS_TTL,
+                               const.REGION_RESULTS_SIZE)
+
+
+def region_buttons(result, cmd_prefix, page=0, token=None):
+    """
+    Returns a list of inlinekeyboardbuttons for one page of the (name, id)-
+    tuples of the regions, an optional fourth element is the district of
+    the region. Results with more than one page are kept in the
+    result-store, the buttons to the other pages refer to them by a token
+    """
     # If the result-tuple is empty, than there are not regions
     # called the way the suer put it in
     if(len(result) == 0):
@@ -58,29 +347,54 @@ def region_cmd_buttons(sel_conn, query, cmd_prefix):
     # If it is not empty, than we have regions we can print to the screen
     # and let the user choose
     else:
+        page_size = const.KEYBOARD_PAGE_SIZE
+        pages = (len(result) + page_size - 1) // page_size
+        page = max(0, min(page, pages - 1))
+
+        if pages > 1 and token is None:
+            token = region_results.put((cmd_prefix, result))
+
         # list to store all buttons
         region_keyboard = []
 
-        # itterate over the result, creating a button for each region
-        for item in result:
+        # itterate over the page, creating a button for each region
+        for item in result[page * page_size:(page + 1) * page_size]:
             # create a command that is send back to the callbacl quary handler
-            # and gets prozessed there
-            command = "{cmd_prefix}_{name}_{id}".format(cmd_prefix=cmd_prefix,
-                                                        name=str(item[1]),
-                                                        id=str(item[0]))
+            # and gets prozessed there, it only carries the GKZ
+            command = region_callback(cmd_prefix, item[1])
 
             # with the command create the button with the name of the region
-            # as button text
-            button = InlineKeyboardButton(text=str(item[0]),
-                                          callback_data=command)
+            # as button text, search-results also show the district
+            text = str(item[0])
+            if len(item) > 3 and item[3] is not None:
+                text = tele_const.REGION_BUTTON.format(name=item[0],
+                                                       district=item[3])
+
+            button = InlineKeyboardButton(text=text, callback_data=command)
 
             # append the button to the list of buttons
             region_keyboard.append([button])
 
+        # buttons to the previous and the next page
+        navigation = []
+        for target, text in ((page - 1, tele_const.PAGE_PREVIOUS),
+                             (page + 1, tele_const.PAGE_NEXT)):
+            if 0 <= target < pages:
+                command = encode_callback(
+                    tele_const.CMD_PAGE_PREFIX,
+                    "{token}.{page}".format(token=token,
+                                            page=to_base36(target)))
+                navigation.append(InlineKeyboardButton(
+                    text=text.format(page=target + 1, pages=pages),
+                    callback_data=command))
+
+        if len(navigation) > 0:
+            region_keyboard.append(navigation)
+
         # add a button to cancel the current operation
         button = InlineKeyboardButton(
                     text=tele_const.CMD_PREFIX_CANCEL,
-                    callback_data=tele_const.CMD_PREFIX_CANCEL)
+                    callback_data=tele_const.CMD_CANCEL_PREFIX)
 
         # append the button to the list of buttons
         region_keyboard.append([button])
@@ -89,26 +403,59 @@ def region_cmd_buttons(sel_conn, query, cmd_prefix):
         return region_keyboard
 
 
-def simple_js_parser(pagecontent):
+def region_page_buttons(token, page):
     """
-    Simple parsing-function for parsing js-data from the corona-dashboard
+    Returns the buttons of another page of a stored result, None if the
+    result expired
     """
-    # create an empty dictionarry
-    variables = {}
+    entry = region_results.get(token)
+
+    if entry is None:
+        return None
+
+    cmd_prefix, result = entry
+
+    return region_buttons(result, cmd_prefix, page, token)
 
-    # get each line, stripping away any leading or ending newline
-    lines = pagecontent.strip("\n").split("\n")
 
-    # iterate over the lines
-    for line in lines:
-        # removing every var-word and replacing it with nothing, afterwards
-        # splitting by the =-Operator surrounded by two spaces
-        # TODO: Check if " = " nessesarry or if splitting by = and stripping
-        # works
-        line_data = line.replace("var", "").split(" = ")
+# a declaration in the files of the dashboard: var <name> = <literal>;
+JS_DECLARATION = re.compile(r"\s*var\s+([A-Za-z_$][\w$]*)\s*=\s*")
+JS_STATEMENT_END = re.compile(r"\s*;?")
+JS_REST_OF_LINE = re.compile(r"[^\n]*")
 
-        variables[line_data[0].strip()] = ast.literal_eval(
-            line_data[1].strip(";"))
+json_decoder = json.JSONDecoder()
+
+
+def simple_js_parser(pagecontent):
+    """
+    Parses the js-data from the corona-dashboard, a sequence of
+    "var name = <literal>;"-declarations
+    """
+    # create an empty dictionarry
+    variables = {}
+    position = 0
+    end = len(pagecontent.rstrip())
+
+    while position < end:
+        declaration = JS_DECLARATION.match(pagecontent, position)
+        if declaration is None:
+            raise ValueError(logg_const.JS_PARSE_ERROR.format(
+                position=position, text=pagecontent[position:position + 40]))
+
+        position = declaration.end()
+
+        # almost every literal is valid json, which the json-module decodes
+        # in C. Everything else, like strings in single quotes, is read as
+        # a python-literal up to the end of the line
+        try:
+            value, position = json_decoder.raw_decode(pagecontent, position)
+        except ValueError:
+            rest = JS_REST_OF_LINE.match(pagecontent, position)
+            value = ast.literal_eval(rest.group(0).strip().rstrip(";"))
+            position = rest.end()
+
+        variables[declaration.group(1)] = value
+        position = JS_STATEMENT_END.match(pagecontent, position).end()
 
     return variables
 
@@ -228,12 +575,281 @@ def string_assembler(data, version_date, total, lookup=None, ordered=False,
     return o_str
 
 
-# Keep the data in the cache, which will get reset every hour
-@lru_cache(maxsize=32)
+class SingleFlight():
+    """
+    Runs a function only once per key at a time. Callers that come while
+    the function runs wait for its result instead of running it again
+    """
+
+    class Flight():
+        '''A call that is currently running, shared by all its callers'''
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        # key -> running Flight
+        self.flights = {}
+        self.lock = threading.Lock()
+
+        # number of callers that got the result of another caller
+        self.shared = 0
+
+    def do(self, key, function, *args):
+        '''Returns the result of function(*args), sharing running calls'''
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self.Flight()
+                self.flights[key] = flight
+            else:
+                self.shared += 1
+
+        # somebody else runs the function already, errors are raised for
+        # every waiting caller
+        if not leader:
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.result
+
+        try:
+            flight.result = function(*args)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+        return flight.result
+
+
+class TTLCache():
+    """
+    A thread-safe cache in which every entry is fresh for ttl seconds.
+    Entries older than refresh_after get reloaded in the background while
+    the old value is still served, so only the very first request for a key
+    waits for the loader. If reloading fails the last good value is kept
+    """
+
+    def __init__(self, loader, ttl, refresh_after, maxsize, version=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self.maxsize = maxsize
+
+        # optional function that returns the version of a value, it runs
+        # once when the value is stored and not on every get
+        self.version = version
+
+        # key -> (value, version, time it got loaded at)
+        self.entries = {}
+        # keys that are reloaded right now, so every key is only reloaded
+        # by one thread at a time
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+        # misses and reloads of the same key share one call of the loader
+        self.flights = SingleFlight()
+
+        # counters, protected by the lock
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        '''Returns the value of the key, loading it only if it is missing'''
+        return self.get_versioned(key)[0]
+
+    def get_versioned(self, key):
+        '''Returns the value of the key and its version as a tuple'''
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                value, version, loaded = entry
+                age = time.monotonic() - loaded
+
+                if age >= self.ttl:
+                    self.stale += 1
+                else:
+                    self.hits += 1
+
+                if age >= self.refresh_after:
+                    self.start_refresh(key)
+
+                return value, version
+
+            self.misses += 1
+
+        # nothing to serve yet, errors of the loader reach the caller
+        return self.flights.do(key, self.load, key)
+
+    def load(self, key):
+        '''Calls the loader and stores the value, returns it and its version'''
+        return self.store(key, self.loader(key))
+
+    def start_refresh(self, key):
+        '''Reloads a key in a background-thread, the lock has to be held'''
+        if key in self.refreshing:
+            return
+
+        self.refreshing.add(key)
+        threading.Thread(target=self.refresh, args=(key,),
+                         daemon=True).start()
+
+    def refresh(self, key):
+        '''Reloads a key, on errors the old value stays in the cache'''
+        try:
+            self.flights.do(key, self.load, key)
+        except Exception as error:
+            with self.lock:
+                self.errors += 1
+                loaded = self.entries.get(key, (None, None,
+                                                time.monotonic()))[2]
+
+            logging.warning(logg_const.CACHE_REFRESH_FAILED.format(
+                key=key, error=error, age=time.monotonic() - loaded))
+        else:
+            with self.lock:
+                self.refreshes += 1
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def refresh_due(self):
+        '''Starts a reload of every entry that is older than refresh_after'''
+        with self.lock:
+            now = time.monotonic()
+
+            for key, (_, _, loaded) in list(self.entries.items()):
+                if now - loaded >= self.refresh_after:
+                    self.start_refresh(key)
+
+    def preload(self, key, value, age):
+        """
+        Puts a value that was loaded age seconds ago into the cache, it gets
+        refreshed like any other entry of that age
+        """
+        version = self.get_version(value)
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, version, time.monotonic() - age)
+
+    def store(self, key, value):
+        """
+        Puts a value into the cache, dropping the oldest entry if full.
+        Returns the value and its version
+        """
+        version = self.get_version(value)
+
+        with self.lock:
+            self.entries[key] = (value, version, time.monotonic())
+
+            if len(self.entries) > self.maxsize:
+                oldest = min(self.entries, key=lambda k: self.entries[k][2])
+                del self.entries[oldest]
+
+        return value, version
+
+    def get_version(self, value):
+        '''Returns the version of a value, None without a version-function'''
+        if self.version is None:
+            return None
+
+        return self.version(value)
+
+    def stats(self):
+        '''Returns the counters and the age of the oldest entry'''
+        with self.lock:
+            now = time.monotonic()
+            max_age = max((now - loaded for _, _, loaded
+                           in self.entries.values()), default=0.0)
+
+            return {"size": len(self.entries),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "stale": self.stale,
+                    "refreshes": self.refreshes,
+                    "errors": self.errors,
+                    "coalesced": self.flights.shared,
+                    "max_age": max_age}
+
+
+# all downloads from the dashboard share one session, so the connections
+# are kept alive. The pool holds one connection per fetch-worker
+dashboard_session = requests.Session()
+dashboard_session.mount("https://", requests.adapters.HTTPAdapter(
+    pool_maxsize=const.DASHBOARD_FETCH_WORKERS))
+
+dashboard_executor = ThreadPoolExecutor(
+    max_workers=const.DASHBOARD_FETCH_WORKERS)
+
+
+def load_data_js(url):
+    """
+    Downloads and interprets a file of the dashboard, failed requests raise
+    an exception so that they never end up in the cache
+    """
+    response = dashboard_session.get(url, timeout=const.HTTP_TIMEOUT)
+    response.raise_for_status()
+    return simple_js_parser(response.text)
+
+
+def get_version(data):
+    """
+    Returns the version of a dashboard-file, every file has a
+    <name>Version-variable. Files without one are versioned by their hash
+    """
+    versions = [str(value) for name, value in sorted(data.items())
+                if name.endswith("Version")]
+
+    if len(versions) > 0:
+        return "|".join(versions)
+
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+# the data of the dashboard only changes a few times a day. The version of
+# a file is worked out once when it is stored
+dashboard_cache = TTLCache(load_data_js, const.DASHBOARD_CACHE_TTL,
+                           const.DASHBOARD_CACHE_REFRESH,
+                           const.DASHBOARD_CACHE_SIZE,
+                           version=get_version)
+
+
 def get_data_js(url):
     """
     Used to get the interpreted json data from the dashbaord
     """
-    page = requests.get(url).text
-    result = simple_js_parser(page)
-    return result
+    return dashboard_cache.get(url)
+
+
+def get_data_js_files(urls):
+    """
+    Gets several files of the dashboard at the same time, returns their
+    (data, version)-tuples in the order of the urls
+    """
+    # every url is only fetched once, the order is kept for merging
+    urls = list(dict.fromkeys(urls))
+
+    # usually all files are cached, then the thread-pool is only overhead
+    if all(url in dashboard_cache for url in urls):
+        return [dashboard_cache.get_versioned(url) for url in urls]
+
+    return list(dashboard_executor.map(dashboard_cache.get_versioned, urls))
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+"""
+The modules of the bot import each other by their plain names, so the tests
+import them the same way
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "telegram_bot"))
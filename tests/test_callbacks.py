@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the decoding of the callback-data of the inline-keyboards"""
+
+import pytest
+
+import utils
+
+
+@pytest.mark.parametrize("data, command", [
+    ("s7sl", ("s", "7sl")),
+    ("u7sl", ("u", "7sl")),
+    ("p0a1b2c3d.1", ("p", "0a1b2c3d.1")),
+    ("c", ("c", "")),
+    # the buttons of older versions
+    ("Subscribe_10101_Eisenstadt", ("s", "7sl")),
+    ("Unsubscribe_10101_Eisenstadt", ("u", "7sl")),
+    ("Cancel", ("c", "")),
+])
+def test_valid_callbacks_are_decoded(data, command):
+    assert utils.decode_callback(data) == command
+
+
+def test_region_callbacks_round_trip():
+    for region_id in (0, 101, 10101, 99999):
+        data = utils.region_callback("s", region_id)
+        assert utils.decode_callback(data) == ("s", utils.to_base36(
+            region_id))
+        assert int(utils.decode_callback(data)[1], 36) == region_id
+
+
+@pytest.mark.parametrize("data", [
+    "", "s", "u", "p", "px", "p.", "pabc.", "p.1", "pa.b.c", "s!!", "s7S",
+    "s-1", "u 1", "cx", "x7sl", "Subscribe", "Subscribe_", "Subscribe_-5",
+    "Subscribe_ 5", "Subscribe_abc", "Cancel_5", "Unknown_5",
+])
+def test_invalid_callbacks_are_rejected(data):
+    assert utils.decode_callback(data) is None
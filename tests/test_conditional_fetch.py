@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the conditional requests of the ingest against a local stand-in
+of the corona-ampel server
+"""
+
+import http.server
+import json
+import threading
+
+import pytest
+
+import data_builder
+
+BODY = json.dumps({"Regionen": []}).encode("utf-8")
+ETAG = '"v1"'
+LAST_MODIFIED = "Fri, 16 Oct 2020 07:00:00 GMT"
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    '''Answers with 304 if the request carries the current etag'''
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_validators_are_only_sent_once_the_body_got_ingested(server,
+                                                             tmp_path):
+    url = "http://127.0.0.1:{port}/CoronaKommissionV2.json".format(
+        port=server.server_address[1])
+    cache_dir = str(tmp_path / "cache")
+    connection = data_builder.create_database(str(tmp_path / "bot.db"))
+
+    assert data_builder.get_corona_data(connection, url,
+                                        cache_dir) == {"Regionen": []}
+
+    # the ingest did not finish, so the file is downloaded again
+    assert data_builder.get_corona_data(connection, url,
+                                        cache_dir) == {"Regionen": []}
+    assert "If-None-Match" not in server.requests[1]
+
+    data_builder.mark_fetch_ingested(connection, url, cache_dir)
+
+    assert data_builder.get_corona_data(connection, url, cache_dir) is None
+    assert server.requests[2]["If-None-Match"] == ETAG
+    assert server.requests[2]["If-Modified-Since"] == LAST_MODIFIED
+
+    connection.close()
+
+
+def test_new_database_next_to_a_warm_cache_gets_the_file(server, tmp_path):
+    url = "http://127.0.0.1:{port}/CoronaKommissionV2.json".format(
+        port=server.server_address[1])
+    cache_dir = str(tmp_path / "cache")
+
+    old = data_builder.create_database(str(tmp_path / "old.db"))
+    data_builder.get_corona_data(old, url, cache_dir)
+    data_builder.mark_fetch_ingested(old, url, cache_dir)
+    old.close()
+
+    # the validators belong to the old database, not to the cache
+    new = data_builder.create_database(str(tmp_path / "new.db"))
+    assert data_builder.get_corona_data(new, url,
+                                        cache_dir) == {"Regionen": []}
+    assert "If-None-Match" not in server.requests[1]
+
+    new.close()
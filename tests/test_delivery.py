@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the pruning of gone chats and failed messages in the delivery"""
+
+import telegram.error
+
+import constants as const
+import delivery
+import migrations
+import outbox
+import subscriptions
+import utils
+
+
+class FakeBot():
+    '''Counts the sends, the blocked chats answer with Unauthorized'''
+
+    def __init__(self, blocked):
+        self.blocked = blocked
+        self.calls = []
+
+    def send_message(self, chat_id, text):
+        self.calls.append(chat_id)
+
+        if chat_id in self.blocked:
+            raise telegram.error.Unauthorized("Forbidden: bot was blocked")
+
+
+def test_gone_chat_is_pruned_once_and_not_sent_to_again(tmp_path):
+    database = utils.ConnectionManager(str(tmp_path / "bot.db"))
+    with database.writer() as connection:
+        migrations.migrate(connection)
+        connection.executemany("INSERT INTO users (id, name) VALUES (?, ?);",
+                               [(1, "one"), (2, "two")])
+        outbox.enqueue_digests(connection, [(1, [], ["a", "b", "c"]),
+                                            (2, [], ["d"])])
+
+    bot = FakeBot(blocked={1})
+
+    # a single thread, so the messages of the chat are send in order
+    queue = delivery.DeliveryQueue(bot, workers=1, rate=1000, burst=1000,
+                                   chat_interval=0)
+    queue.start()
+    pruned = []
+
+    def on_pruned(chat_id):
+        pruned.append(chat_id)
+        queue.chat_pruned(chat_id)
+
+    outbox.deliver_pending(database, queue, "test", on_pruned=on_pruned)
+    queue.stop()
+
+    stats = queue.stats()
+    assert bot.calls.count(1) == 1
+    assert pruned == [1]
+    assert stats["pruned"] == 1
+    assert stats["sent"] == 1
+    assert stats["failed"] == 3
+    assert stats["dropped"] == 2
+
+    active = dict(utils.fetch_all(database.reader(),
+                                  "SELECT id, active FROM users;"))
+    assert active == {1: 0, 2: 1}
+
+
+def test_pruned_chat_leaves_the_subscription_index_at_once(tmp_path):
+    database = utils.ConnectionManager(str(tmp_path / "bot.db"))
+    with database.writer() as connection:
+        migrations.migrate(connection)
+        connection.execute("INSERT INTO regions (id, type, name) "
+                           "VALUES (10101, 'Gemeinde', 'Eisenstadt');")
+        connection.executemany("INSERT INTO users (id, name) VALUES (?, ?);",
+                               [(1, "one"), (2, "two")])
+        connection.executemany("INSERT INTO subscriptions (users_id, "
+                               "regions_id) VALUES (?, 10101);", [(1,), (2,)])
+        outbox.enqueue_digests(connection, [(1, [], ["a"]), (2, [], ["b"])])
+
+    index = subscriptions.SubscriptionIndex()
+    index.load(database.reader())
+
+    queue = delivery.DeliveryQueue(FakeBot(blocked={1}), workers=1,
+                                   rate=1000, burst=1000, chat_interval=0)
+    queue.start()
+    in_transaction = []
+
+    def on_pruned(chat_id):
+        in_transaction.append(database.writer_connection.in_transaction)
+        index.set_active(chat_id, False)
+
+    outbox.deliver_pending(database, queue, "test", on_pruned=on_pruned)
+    queue.stop()
+
+    # the index follows the database without waiting for the reconcile
+    assert in_transaction == [True]
+    assert index.subscribers(10101) == {2}
+
+    with database.writer() as connection:
+        assert index.reconcile(connection) == 0
+
+
+def test_message_with_unexpected_errors_is_given_up(tmp_path):
+    '''Errors like ChatMigrated leave the message pending, but not forever'''
+    database = utils.ConnectionManager(str(tmp_path / "bot.db"))
+    with database.writer() as connection:
+        migrations.migrate(connection)
+        outbox.enqueue_digests(connection, [(1, [], ["a"])])
+
+    error = telegram.error.ChatMigrated(2)
+    claims = 0
+
+    while True:
+        # the lease expires right away, as if the worker got restarted
+        with database.writer() as connection:
+            rows = outbox.claim_batch(connection, "test", lease=-1)
+
+        if len(rows) == 0:
+            break
+
+        claims += 1
+        outbox.mark_message(database, rows[0][0], 1, error)
+
+    assert claims == const.OUTBOX_MAX_ATTEMPTS
+    assert utils.fetch_all(database.reader(),
+                           "SELECT state, attempts FROM outbox;") == [
+        (2, const.OUTBOX_MAX_ATTEMPTS)]
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the standalone delivery-workers, several sharded workers share
+one database and a fake bot-api
+"""
+
+import threading
+import time
+
+import delivery_worker
+import migrations
+import outbox
+import utils
+
+QUEUE_OPTIONS = {"workers": 2, "rate": 10000, "burst": 10000,
+                 "chat_interval": 0}
+
+
+class FakeBot():
+    '''Records every message, sending takes a millisecond'''
+
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        time.sleep(0.001)
+
+        with self.lock:
+            self.sent.append(text)
+
+    def count(self):
+        with self.lock:
+            return len(self.sent)
+
+
+def start(worker):
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+
+    return thread
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_sharded_workers_deliver_every_message_once(tmp_path):
+    sql_path = str(tmp_path / "bot.db")
+    database = utils.ConnectionManager(sql_path)
+
+    with database.writer() as connection:
+        migrations.migrate(connection)
+        outbox.enqueue_digests(connection, [
+            (chat_id, [], ["{chat_id}-{number}".format(chat_id=chat_id,
+                                                       number=number)
+                           for number in range(3)])
+            for chat_id in range(200)])
+
+    def pending():
+        return utils.fetch_one(database.reader(), "SELECT count(*) FROM "
+                               "outbox WHERE state = 0;")[0]
+
+    bot = FakeBot()
+    workers = [delivery_worker.DeliveryWorker(bot, sql_path, shard, 2,
+                                              batch_size=20,
+                                              poll_interval=0.05,
+                                              **QUEUE_OPTIONS)
+               for shard in range(2)]
+    threads = [start(worker) for worker in workers]
+
+    # the first worker stops in the middle of the run, its claimed but
+    # unsent messages go back to the outbox
+    wait_for(lambda: bot.count() >= 100)
+    workers[0].stop()
+    threads[0].join()
+    assert pending() > 0
+
+    # a new worker takes over the shard
+    workers[0] = delivery_worker.DeliveryWorker(bot, sql_path, 0, 2,
+                                                batch_size=20,
+                                                poll_interval=0.05,
+                                                **QUEUE_OPTIONS)
+    threads[0] = start(workers[0])
+
+    wait_for(lambda: pending() == 0)
+    for worker, thread in zip(workers, threads):
+        worker.stop()
+        thread.join()
+
+    assert sorted(bot.sent) == sorted(
+        "{chat_id}-{number}".format(chat_id=chat_id, number=number)
+        for chat_id in range(200) for number in range(3))
+    assert utils.fetch_all(database.reader(), "SELECT DISTINCT state "
+                           "FROM outbox;") == [(1,)]
+
+    database.close()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the incremental decoding of the Warnstufen-history"""
+
+import io
+import json
+
+import pytest
+
+from data_builder import iter_json_array
+
+CHUNK_SIZES = [1, 2, 3, 7, 64]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", [
+    "[]",
+    " [ ] ",
+    "[1234, 5]",
+    "[-0.5e-3,null, true]",
+    '[{"a": "],[", "b": [1, 2]} , "x,]", 12.5e3]',
+])
+def test_decodes_like_json_loads(text, chunk_size):
+    '''Numbers cut off by a chunk are not split into two elements'''
+    result = list(iter_json_array(io.StringIO(text), chunk_size))
+
+    assert result == json.loads(text)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", [
+    "[1,,,,2]", "[1 2]", "[,1]", "[1,]", "[1", "x[1]", "[12x]",
+])
+def test_rejects_invalid_arrays(text, chunk_size):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO(text), chunk_size))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the schema-migrations and the query-plan check"""
+
+import migrations
+import utils
+
+
+def test_concurrent_migrate_skips_applied_migrations(tmp_path, monkeypatch):
+    '''A process that read an old version does not apply it a second time'''
+    path = str(tmp_path / "bot.db")
+    first = utils.connect(path)
+    second = utils.connect(path)
+
+    # both processes read the empty schema, then the first one migrates
+    stale_version = migrations.get_schema_version(second)
+    migrations.migrate(first)
+
+    read_version = migrations.get_schema_version
+    reads = []
+
+    def get_schema_version(connection):
+        reads.append(connection)
+        if len(reads) == 1:
+            return stale_version
+        return read_version(connection)
+
+    monkeypatch.setattr(migrations, "get_schema_version", get_schema_version)
+
+    assert migrations.migrate(second) == migrations.MIGRATIONS[-1][0]
+
+
+def test_hot_queries_use_indexes():
+    connection = utils.connect(":memory:")
+    migrations.migrate(connection)
+
+    assert migrations.find_table_scans(connection) == []
+
+
+def test_table_scan_matches_old_and_new_plans():
+    '''sqlite before 3.36 prints "SCAN TABLE <table>"'''
+    for detail in ("SCAN users", "SCAN TABLE users",
+                   "SCAN TABLE users AS u"):
+        assert migrations.TABLE_SCAN.match(detail).group(1) == "users"
+
+    for detail in ("SCAN users USING INDEX users_active",
+                   "SCAN TABLE users USING COVERING INDEX users_active",
+                   "SEARCH users USING INTEGER PRIMARY KEY (rowid=?)"):
+        assert migrations.TABLE_SCAN.match(detail) is None
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the filling of the full-text index of the regions"""
+
+import data_builder
+import region_index
+import utils
+
+REGIONS = {"Regionen": [
+    {"GKZ": "1", "Region": "Bundesland", "Name": "Burgenland"},
+    {"GKZ": "101", "Region": "Bezirk", "Name": "Eisenstadt(Stadt)"},
+    {"GKZ": "10101", "Region": "Gemeinde", "Name": "Eisenstadt"},
+]}
+
+
+def count_search(connection):
+    return utils.fetch_one(connection, "SELECT count(*) FROM regions_fts;")[0]
+
+
+def test_unchanged_regions_still_fill_an_empty_index(tmp_path):
+    '''After the upgrade the sync-hash matches, but the index is empty'''
+    connection = data_builder.create_database(str(tmp_path / "bot.db"))
+
+    assert data_builder.insert_regions(connection, REGIONS) == 3
+    connection.execute("DELETE FROM regions_fts;")
+
+    assert data_builder.insert_regions(connection, REGIONS) == 0
+    assert count_search(connection) == 3
+
+    connection.close()
+
+
+def test_unchanged_feed_fills_an_empty_index(tmp_path):
+    '''A 304 of the regions-feed never reaches insert_regions'''
+    connection = data_builder.create_database(str(tmp_path / "bot.db"))
+    data_builder.insert_regions(connection, REGIONS)
+    connection.execute("DELETE FROM regions_fts;")
+
+    assert data_builder.sync_region_search(connection)
+    assert not data_builder.sync_region_search(connection)
+
+    database = utils.ConnectionManager(str(tmp_path / "bot.db"))
+    assert [result[0] for result in region_index.FtsRegionSearch(
+        database).search("eisen")] == ["Eisenstadt"]
+
+    database.close()
+    connection.close()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the rendering of the statistics-responses per data-version"""
+
+import pytest
+
+import constants as const
+import responses
+import utils
+
+
+class Dashboard():
+    '''The files of the dashboard, counts how often they are versioned'''
+
+    def __init__(self, files):
+        self.files = files
+        self.versioned = 0
+
+    def load(self, url):
+        return dict(self.files[url.rsplit("/", 1)[-1]])
+
+    def version(self, data):
+        self.versioned += 1
+        return utils.get_version(data)
+
+
+@pytest.fixture
+def dashboard(monkeypatch):
+    '''Replaces the dashboard-cache and the render-cache with empty ones'''
+    dashboard = Dashboard({})
+    monkeypatch.setattr(utils, "dashboard_cache", utils.TTLCache(
+        dashboard.load, ttl=60, refresh_after=45, maxsize=32,
+        version=dashboard.version))
+    monkeypatch.setattr(responses, "render_cache", responses.RenderCache())
+    monkeypatch.setattr(responses, "yesterday",
+                        responses.Yesterday(["a.js"]))
+
+    return dashboard
+
+
+def test_files_without_version_are_rendered_again_on_change(dashboard):
+    '''A file without a <name>Version-variable is versioned by its data'''
+    dashboard.files["a.js"] = {"dpValue": 1}
+
+    def render(data):
+        return "value {value}".format(value=data["dpValue"])
+
+    assert responses.get_response("test", ["a.js"], render) == "value 1"
+    assert responses.get_response("test", ["a.js"], render) == "value 1"
+    assert responses.render_cache.renders == 1
+
+    dashboard.files["a.js"] = {"dpValue": 2}
+    utils.dashboard_cache.store(const.DASHBOARD_URL_PREFIX + "a.js",
+                                dashboard.load("a.js"))
+    assert responses.get_response("test", ["a.js"], render) == "value 2"
+    assert responses.render_cache.renders == 2
+
+
+def test_versions_are_worked_out_once_per_store(dashboard):
+    dashboard.files.update({"a.js": {"dpValue": 1, "AVersion": "1"},
+                            "b.js": {"dpOther": 1}})
+
+    for _ in range(3):
+        responses.get_response("test", ["a.js", "b.js"], str)
+
+    assert responses.render_cache.renders == 1
+    assert dashboard.versioned == 2
+
+    dashboard.files["a.js"] = {"dpValue": 1, "AVersion": "2"}
+    utils.dashboard_cache.store(const.DASHBOARD_URL_PREFIX + "a.js",
+                                dashboard.load("a.js"))
+    responses.get_response("test", ["a.js", "b.js"], str)
+
+    assert responses.render_cache.renders == 2
+    assert dashboard.versioned == 3
+
+
+def test_caseinfo_uses_the_loaded_yesterday(dashboard, monkeypatch):
+    '''/caseinfo reads yesterday from memory, Yesterday.refresh loads it'''
+    for url in const.EPIDEMIC_OVERVIEW_URLS:
+        dashboard.files[url] = {url + "Version": "1"}
+
+    rendered = []
+
+    def render_caseinfo(data, yesterday):
+        rendered.append(yesterday)
+        return "caseinfo"
+
+    monkeypatch.setattr(responses, "render_caseinfo", render_caseinfo)
+
+    snapshots = [None]
+    monkeypatch.setattr(responses.snapshots, "load_yesterday",
+                        lambda connection, urls: snapshots[0])
+
+    responses.yesterday.refresh(None)
+    for _ in range(3):
+        assert responses.caseinfo() == "caseinfo"
+
+    # a new snapshot of yesterday renders the response again
+    snapshots[0] = {"dpValue": 1}
+    responses.yesterday.refresh(None)
+    responses.caseinfo()
+
+    assert rendered == [{}, {"dpValue": 1}]
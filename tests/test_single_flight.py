@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the coalescing of concurrent loads in the dashboard-cache"""
+
+import threading
+import time
+
+import pytest
+
+import utils
+
+CALLERS = 100
+
+
+class Loader():
+    '''A slow loader that counts its calls and can fail'''
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, key):
+        with self.lock:
+            self.calls += 1
+
+        # long enough that every caller arrives while the load runs
+        time.sleep(0.2)
+
+        if self.error is not None:
+            raise self.error
+
+        return "data of " + key
+
+
+def call_concurrently(cache, key):
+    '''Releases CALLERS threads at once, returns their results or errors'''
+    barrier = threading.Barrier(CALLERS)
+    results = [None] * CALLERS
+
+    def call(number):
+        barrier.wait()
+        try:
+            results[number] = cache.get(key)
+        except Exception as error:
+            results[number] = error
+
+    threads = [threading.Thread(target=call, args=(number,))
+               for number in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def test_concurrent_callers_cause_one_fetch():
+    loader = Loader()
+    cache = utils.TTLCache(loader, ttl=60, refresh_after=45, maxsize=8)
+
+    results = call_concurrently(cache, "Bundesland.js")
+
+    assert results == ["data of Bundesland.js"] * CALLERS
+    assert loader.calls == 1
+
+    stats = cache.stats()
+    assert stats["misses"] == CALLERS
+    assert stats["coalesced"] == CALLERS - 1
+
+
+def test_failing_loader_reaches_every_caller_and_leaves_no_flight():
+    error = RuntimeError("dashboard unavailable")
+    loader = Loader(error)
+    cache = utils.TTLCache(loader, ttl=60, refresh_after=45, maxsize=8)
+
+    results = call_concurrently(cache, "Bundesland.js")
+
+    assert all(result is error for result in results)
+    assert loader.calls == 1
+    assert cache.flights.flights == {}
+
+    # the next caller starts a new load instead of waiting forever
+    with pytest.raises(RuntimeError):
+        cache.get("Bundesland.js")
+    assert loader.calls == 2
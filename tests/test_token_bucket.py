@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the flood-limit pauses of the token-bucket of the delivery"""
+
+import threading
+
+import delivery
+
+
+def test_concurrent_pauses_end_at_the_latest_deadline():
+    bucket = delivery.TokenBucket(rate=25, capacity=25)
+    barrier = threading.Barrier(8)
+
+    # every worker gets a RetryAfter(30) at the same time
+    def pause():
+        barrier.wait()
+        bucket.pause(30)
+
+    threads = [threading.Thread(target=pause) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 30 seconds of tokens are missing, not 8 * 30
+    assert -30 * 25 <= bucket.tokens < -30 * 25 + 25
+
+
+def test_shorter_pause_does_not_shorten_a_longer_one():
+    bucket = delivery.TokenBucket(rate=25, capacity=25)
+
+    bucket.pause(30)
+    bucket.pause(5)
+
+    assert bucket.tokens < -29 * 25